@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+"""Time and memory-profile the grab_* parsers and gen_* generators
+
+Synthetic logs from synth_logs.py are written once per size into a work
+directory, every benchmark is run repeat times on them, and the results
+are written to a JSON report that can be compared with the report of
+another revision:
+
+    python bench/run_bench.py -sizes small,medium -out new.json
+    python bench/run_bench.py -compare old.json new.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import numpy as np
+
+import synth_logs
+import gauss_log
+import gen_gaussian
+import gen_ntos
+import grab_emission
+import grab_freq
+import grab_gaussian
+import harvest
+
+# Corpus sizes, from a few KB per log up to several GB for huge
+SIZES = {
+    "small": {"ngeoms": 1, "natoms": 10, "nstates": 6, "nmodes": 30, "npoints": 500, "nmol": 20},
+    "medium": {"ngeoms": 200, "natoms": 50, "nstates": 50, "nmodes": 150, "npoints": 20000, "nmol": 200},
+    "large": {"ngeoms": 5000, "natoms": 100, "nstates": 100, "nmodes": 300, "npoints": 500000, "nmol": 1000},
+    "huge": {"ngeoms": 150000, "natoms": 100, "nstates": 200, "nmodes": 600, "npoints": 5000000, "nmol": 5000},
+}
+
+def _quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+def parser_benchmarks():
+    """Return (name, log, call) for every parser, run inside a molecule directory"""
+    return [
+        ("scan_log[geom_opt]", "ground_state_geom_opt/geom_opt.log", lambda: gauss_log.scan_log("ground_state_geom_opt/geom_opt.log")),
+        ("scan_log[exc_geom]", "exc_geom/exc_geom.log", lambda: gauss_log.scan_log("exc_geom/exc_geom.log")),
+        ("grab_excited", "vert_exc/vert_exc.log", lambda: _quiet(grab_gaussian.grab_excited, -1)),
+        ("excited_table", "vert_exc/vert_exc.log", lambda: grab_gaussian.excited_table()),
+        ("grab_exc_solv", "exc_solv/exc_solv.log", lambda: grab_gaussian.grab_exc_solv()),
+        ("grab_gs_sp", "gs_sp/gs_sp.log", lambda: grab_gaussian.grab_gs_sp()),
+        ("grab_trans", "vert_exc/vert_exc.log", lambda: gen_ntos.grab_trans(1)),
+        ("grab_spectra", "band_shape.log", lambda: grab_emission.grab_spectra("band_shape.log")),
+        ("grab_freq", "raman/raman.log", lambda: grab_freq.grab_freq("raman/raman.log")),
+        ("harvest_molecule", None, lambda: harvest.harvest_molecule(".")),
+    ]
+
+def generator_benchmarks(coords, xyzdir):
+    """Return (name, call) for every generator, run inside an empty directory"""
+    return [
+        ("gen_gs_geom_opt", lambda: gen_gaussian.gen_gs_geom_opt(coords)),
+        ("gen_vert_exc", lambda: gen_gaussian.gen_vert_exc()),
+        ("gen_exc_geom", lambda: gen_gaussian.gen_exc_geom()),
+        ("gen_exc_solv", lambda: gen_gaussian.gen_exc_solv()),
+        ("gen_gs_sp", lambda: gen_gaussian.gen_gs_sp()),
+        ("gen_sub_script", lambda: gen_gaussian.gen_sub_script("Methanol")),
+        ("gen_ir", lambda: gen_gaussian.gen_ir(coords, "mol")),
+        ("gen_raman", lambda: gen_gaussian.gen_raman(coords, "mol")),
+        ("gen_spec_script", lambda: gen_gaussian.gen_spec_script("Methanol", "mol")),
+        ("gen_all_ntos", lambda: gen_ntos.gen_all_ntos()),
+        ("gen_batch", lambda: gen_gaussian.gen_batch(gen_gaussian.list_coords(xyzdir), outdir="batch")),
+    ]
+
+def measure(call, repeat):
+    """Time call repeat times and record its peak Python heap use in one extra run"""
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"time_min": min(times), "time_median": float(np.median(times)), "peak_bytes": peak}
+
+def run_size(size, workdir, repeat):
+    """Write the corpus of one size and run every benchmark on it"""
+    params = dict(SIZES[size])
+    nmol = params.pop("nmol")
+    corpus = os.path.join(workdir, size)
+    mol = os.path.join(corpus, "mol")
+    if not os.path.isdir(mol):
+        synth_logs.write_molecule(mol, **params)
+    numbers, xyz = synth_logs.molecule(params["natoms"], np.random.default_rng(0))
+    symbols = dict(synth_logs.ELEMENTS)
+    coords = ["%s %.6f %.6f %.6f" % (symbols[n], x[0], x[1], x[2]) for n, x in zip(numbers, xyz)]
+    xyzdir = os.path.join(corpus, "xyz")
+    if not os.path.isdir(xyzdir):
+        os.makedirs(xyzdir)
+        for i in range(nmol):
+            with open(os.path.join(xyzdir, "mol_%05d.xyz" % i), "w") as f:
+                f.write("%d\nsynthetic\n%s\n" % (len(coords), "\n".join(coords)))
+    results = []
+    cwd = os.getcwd()
+    try:
+        os.chdir(mol)
+        for name, log, call in parser_benchmarks():
+            result = measure(call, repeat)
+            result.update({"name": name, "size": size, "kind": "parser",
+                           "input_bytes": os.path.getsize(log) if log else sum(os.path.getsize(os.path.join(d, n)) for d, _, ns in os.walk(".") for n in ns)})
+            results.append(result)
+        out = tempfile.mkdtemp(dir=workdir)
+        os.chdir(out)
+        os.makedirs("vert_exc")
+        shutil.copy(os.path.join(mol, "vert_exc/vert_exc.log"), "vert_exc/vert_exc.log")
+        for name, call in generator_benchmarks(coords, xyzdir):
+            result = measure(call, repeat)
+            result.update({"name": name, "size": size, "kind": "generator",
+                           "input_bytes": os.path.getsize("vert_exc/vert_exc.log") if name == "gen_all_ntos" else 0})
+            results.append(result)
+    finally:
+        os.chdir(cwd)
+    return results
+
+def metadata():
+    """Describe the revision and machine a report was made on"""
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        revision = ""
+    return {"revision": revision, "python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+def compare(old, new, threshold=0.2):
+    """Print the time and memory ratios of two reports
+
+    Args:
+        old (dict): The baseline report
+        new (dict): The report to check
+        threshold (float): Relative slowdown reported as a regression [default: 0.2]
+
+    Returns:
+        regressions (list): Names of the benchmarks that got slower than threshold
+
+    """
+    before = dict(((r["name"], r["size"]), r) for r in old["results"])
+    regressions = []
+    print("%-22s %-7s %12s %12s %8s %8s" % ("benchmark", "size", "old [s]", "new [s]", "time", "memory"))
+    for r in new["results"]:
+        key = (r["name"], r["size"])
+        if key not in before:
+            continue
+        b = before[key]
+        ratio = r["time_min"] / max(b["time_min"], 1e-12)
+        mem = r["peak_bytes"] / max(b["peak_bytes"], 1)
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = " REGRESSION"
+            regressions.append("%s[%s]" % key)
+        print("%-22s %-7s %12.6f %12.6f %7.2fx %7.2fx%s" % (key[0], key[1], b["time_min"], r["time_min"], ratio, mem, flag))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the grab_* parsers and gen_* generators on synthetic logs')
+    parser.add_argument('-sizes', type=str, default="small,medium", help='Comma separated corpus sizes: %s [default: small,medium]' % ",".join(SIZES))
+    parser.add_argument('-repeat', type=int, default=5, help='Timed runs per benchmark [default: 5]')
+    parser.add_argument('-workdir', type=str, default="bench_data", help='Directory for the synthetic corpora, reused between runs [default: bench_data]')
+    parser.add_argument('-out', type=str, default="bench_report.json", help='Report file [default: bench_report.json]')
+    parser.add_argument('-compare', type=str, nargs=2, default=None, help='Compare two reports instead of running: OLD NEW')
+    parser.add_argument('-threshold', type=float, default=0.2, help='Relative slowdown counted as a regression [default: 0.2]')
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        sys.exit(1 if compare(old, new, threshold=args.threshold) else 0)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    workdir = os.path.abspath(args.workdir)
+    results = []
+    for size in args.sizes.split(","):
+        results += run_size(size, workdir, args.repeat)
+    with open(args.out, "w") as f:
+        json.dump({"meta": metadata(), "results": results}, f, indent=1)
+    for r in results:
+        print("%-22s %-7s %12.6f s %12d B peak %12d B input" % (r["name"], r["size"], r["time_min"], r["peak_bytes"], r["input_bytes"]))
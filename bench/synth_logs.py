@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""Write synthetic gaussian logs for benchmarking the grab_* parsers
+
+The logs carry every line the parsers look for, in gaussian's layout, with
+random but reproducible numbers. Their size is set by the number of
+optimization steps (each prints a geometry, SCF cycles and convergence
+table), excited states, normal modes and spectrum points.
+"""
+import argparse
+import os
+
+import numpy as np
+
+ELEMENTS = [(1, "H"), (6, "C"), (7, "N"), (8, "O")]
+
+def _header(f, nproc=28, nbasis=300):
+    f.write(" Entering Gaussian System, Link 0=g16\n")
+    f.write(" %%nprocshared=%d\n" % nproc)
+    f.write(" Will use up to %4d processors via shared memory.\n" % nproc)
+    f.write(" ----------------------------------------------------------------------\n")
+    f.write(" #n B3LYP/6-31G(d,p) synthetic benchmark route\n")
+    f.write(" ----------------------------------------------------------------------\n")
+    f.write(" %6d basis functions, %6d primitive gaussians, %6d cartesian basis functions\n" % (nbasis, 2*nbasis, nbasis+10))
+
+def _footer(f, rng):
+    cpu = rng.uniform(60, 36000)
+    f.write(" Job cpu time:       0 days %2d hours %2d minutes %4.1f seconds.\n" % (cpu//3600, (cpu % 3600)//60, cpu % 60))
+    wall = cpu / 20
+    f.write(" Elapsed time:       0 days %2d hours %2d minutes %4.1f seconds.\n" % (wall//3600, (wall % 3600)//60, wall % 60))
+    f.write(" Normal termination of Gaussian 16 at Thu Jan  1 00:00:00 2026.\n")
+
+def _geometry(f, coords, numbers):
+    f.write("                         Standard orientation:                         \n")
+    f.write(" ---------------------------------------------------------------------\n")
+    f.write(" Center     Atomic      Atomic             Coordinates (Angstroms)\n")
+    f.write(" Number     Number       Type             X           Y           Z\n")
+    f.write(" ---------------------------------------------------------------------\n")
+    for i in range(len(numbers)):
+        f.write(" %6d %10d %11d %15.6f %11.6f %11.6f\n" % (i+1, numbers[i], 0, coords[i,0], coords[i,1], coords[i,2]))
+    f.write(" ---------------------------------------------------------------------\n")
+
+def _scf(f, rng, ncycles=12):
+    for cycle in range(1, ncycles+1):
+        f.write(" Cycle %3d  Pass 1  IDiag  1:\n" % cycle)
+        f.write(" E= %.12f     Delta-E=       %.12f Rises=F Damp=F\n" % (-500.0 + rng.normal(), rng.normal()*1e-4))
+    f.write(" SCF Done:  E(RB3LYP) =  %.9f     A.U. after %4d cycles\n" % (-500.0 + 1e-3*rng.normal(), ncycles))
+
+def _states(f, rng, nstates, ntrans=4, homo=45):
+    ev = np.sort(rng.uniform(2.0, 7.0, nstates))
+    for i in range(nstates):
+        f.write(" Excited State %3d:      Singlet-A    %7.4f eV  %7.2f nm  f=%.4f  <S**2>=0.000\n" % (i+1, ev[i], 1239.84198/ev[i], rng.uniform(0, 1)))
+        for j in range(ntrans):
+            f.write("     %4d -> %-4d       %8.5f\n" % (homo - j % 3, homo + 1 + j // 3, rng.uniform(-0.7, 0.7)))
+        f.write("\n")
+
+def molecule(natoms, rng):
+    """Return random atomic numbers and coordinates of a molecule"""
+    picks = rng.integers(0, len(ELEMENTS), natoms)
+    numbers = np.array([ELEMENTS[p][0] for p in picks])
+    return numbers, rng.normal(scale=2.0, size=(natoms, 3))
+
+def write_log(path, ngeoms=1, natoms=20, nstates=0, corrected=False, seed=0):
+    """Write a synthetic optimization, TD or single point log
+
+    Args:
+        path (str): The log to write
+        ngeoms (int): Number of geometries (optimization steps) [default: 1]
+        natoms (int): Number of atoms [default: 20]
+        nstates (int): Excited states printed per step, 0 for none [default: 0]
+        corrected (bool): Print a Total energy after correction line [default: False]
+        seed (int): Random seed [default: 0]
+
+    """
+    rng = np.random.default_rng(seed)
+    numbers, coords = molecule(natoms, rng)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        _header(f, nbasis=15*natoms)
+        for step in range(ngeoms):
+            coords = coords + rng.normal(scale=1e-3, size=coords.shape)
+            _geometry(f, coords, numbers)
+            _scf(f, rng)
+            if nstates:
+                _states(f, rng, nstates)
+            if corrected:
+                f.write(" Total energy after correction                    =   %.9f a.u.\n" % (-499.9 + 1e-3*rng.normal()))
+            if ngeoms > 1:
+                f.write("         Item               Value     Threshold  Converged?\n")
+                f.write(" Maximum Force            %.6f     0.000450     NO \n" % rng.uniform(0, 1e-2))
+                f.write(" Maximum Displacement     %.6f     0.001800     NO \n" % rng.uniform(0, 1e-1))
+                f.write(" Step number %3d out of a maximum of  %3d\n" % (step+1, max(100, ngeoms)))
+        _footer(f, rng)
+
+def write_freq_log(path, nmodes=60, raman=True, seed=0):
+    """Write a synthetic freq or freq=Raman log with nmodes normal modes"""
+    rng = np.random.default_rng(seed)
+    freq = np.sort(rng.uniform(20, 3500, nmodes))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        _header(f)
+        f.write(" Harmonic frequencies (cm**-1), IR intensities (KM/Mole), Raman scattering\n")
+        f.write(" activities (A**4/AMU), depolarization ratios for plane and unpolarized\n")
+        for start in range(0, nmodes, 3):
+            cols = range(start, min(nmodes, start+3))
+            f.write("                  " + "".join("%23d" % (i+1) for i in cols) + "\n")
+            f.write(" Frequencies --" + "".join("%23.4f" % freq[i] for i in cols) + "\n")
+            f.write(" Red. masses --" + "".join("%23.4f" % rng.uniform(1, 12) for i in cols) + "\n")
+            f.write(" IR Inten    --" + "".join("%23.4f" % rng.uniform(0, 300) for i in cols) + "\n")
+            if raman:
+                f.write(" Raman Activ --" + "".join("%23.4f" % rng.uniform(0, 100) for i in cols) + "\n")
+        _footer(f, rng)
+
+def write_band_log(path, npoints=2000, nspectra=1, seed=0):
+    """Write a synthetic band-shape log with nspectra Final Spectrum blocks"""
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        _header(f)
+        for spectrum in range(nspectra):
+            f.write(" Final Spectrum:\n ---------------\n")
+            f.write(" Band broadening simulated by mean of Gaussian functions with\n")
+            f.write(" Half-Widths at Half-Maximum of  135.00 cm^(-1)\n")
+            f.write(" Legend:\n -------\n 1st col.: Energy (in cm^-1)\n 2nd col.: Intensity at T=0K\n")
+            f.write(" -----------------------------------\n")
+            grid = np.linspace(10000, 40000, npoints)
+            for x, y in zip(grid, rng.uniform(0, 1, npoints)):
+                f.write("   %12.4f   %.6fD+00\n" % (x, y))
+            f.write(" -----------------------------------\n")
+        _footer(f, rng)
+
+def write_molecule(path, ngeoms=10, natoms=20, nstates=6, nmodes=60, npoints=2000, seed=0):
+    """Write the step logs of one molecule directory
+
+    Args:
+        path (str): The molecule directory
+        ngeoms (int): Optimization steps of the geom_opt and exc_geom logs [default: 10]
+        natoms (int): Number of atoms [default: 20]
+        nstates (int): Number of excited states [default: 6]
+        nmodes (int): Number of normal modes of the freq logs [default: 60]
+        npoints (int): Points of the band-shape spectrum [default: 2000]
+        seed (int): Random seed [default: 0]
+
+    """
+    write_log(os.path.join(path, "ground_state_geom_opt/geom_opt.log"), ngeoms=ngeoms, natoms=natoms, seed=seed)
+    write_log(os.path.join(path, "vert_exc/vert_exc.log"), natoms=natoms, nstates=nstates, seed=seed+1)
+    write_log(os.path.join(path, "exc_geom/exc_geom.log"), ngeoms=ngeoms, natoms=natoms, nstates=nstates, seed=seed+2)
+    write_log(os.path.join(path, "exc_solv/exc_solv.log"), natoms=natoms, nstates=nstates, corrected=True, seed=seed+3)
+    write_log(os.path.join(path, "gs_sp/gs_sp.log"), natoms=natoms, seed=seed+4)
+    write_freq_log(os.path.join(path, "infrared/infrared.log"), nmodes=nmodes, raman=False, seed=seed+5)
+    write_freq_log(os.path.join(path, "raman/raman.log"), nmodes=nmodes, seed=seed+6)
+    write_band_log(os.path.join(path, "band_shape.log"), npoints=npoints, seed=seed+7)
+
+def write_campaign(root, nmol=10, **kwargs):
+    """Write nmol molecule directories mol_00000, mol_00001, ... below root"""
+    for i in range(nmol):
+        write_molecule(os.path.join(root, "mol_%05d" % i), seed=7*i, **kwargs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write synthetic gaussian logs for benchmarking')
+    parser.add_argument('-root', type=str, default="synthetic", help='Output directory [default: synthetic]')
+    parser.add_argument('-nmol', type=int, default=10, help='Number of molecule directories [default: 10]')
+    parser.add_argument('-ngeoms', type=int, default=10, help='Optimization steps per opt log [default: 10]')
+    parser.add_argument('-natoms', type=int, default=20, help='Number of atoms [default: 20]')
+    parser.add_argument('-nstates', type=int, default=6, help='Number of excited states [default: 6]')
+    parser.add_argument('-nmodes', type=int, default=60, help='Number of normal modes [default: 60]')
+    parser.add_argument('-npoints', type=int, default=2000, help='Points per band-shape spectrum [default: 2000]')
+    args = parser.parse_args()
+
+    write_campaign(args.root, nmol=args.nmol, ngeoms=args.ngeoms, natoms=args.natoms, nstates=args.nstates,
+                   nmodes=args.nmodes, npoints=args.npoints)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+import argparse
+
+import numpy as np
+
+import spec_archive
+
+# h*c in eV nm, to convert between photon energy and wavelength
+HC_EV_NM = 1239.84198
+
+def line_shape(x, fwhm, shape="gaussian"):
+    """Evaluate a unit-area line shape
+
+    Args:
+        x (np.array): Distance from the line center, in the units of fwhm
+        fwhm (float): Full width at half maximum
+        shape (str): gaussian or lorentzian [default: gaussian]
+
+    Returns:
+        y (np.array): The line shape at x
+
+    """
+    if shape == "gaussian":
+        sigma = fwhm / (2.0*np.sqrt(2.0*np.log(2.0)))
+        return np.exp(-0.5*(x/sigma)**2) / (sigma*np.sqrt(2.0*np.pi))
+    if shape == "lorentzian":
+        gamma = 0.5*fwhm
+        return gamma / (np.pi*(x**2 + gamma**2))
+    raise ValueError("Unknown line shape %s" % shape)
+
+def broaden(centers, strengths, grid, fwhm, shape="gaussian", max_bytes=2**26):
+    """Convolve the stick spectra of many molecules with a line shape
+
+    The sticks of a molecule are one row of centers and strengths; rows
+    with fewer sticks are padded with NaN, which contribute nothing. All
+    molecules share one grid. Molecules are processed in chunks so that the
+    (molecules, sticks, grid) work array never exceeds max_bytes.
+
+    Args:
+        centers (np.array): (nmol, nsticks) stick positions, in the units of grid
+        strengths (np.array): (nmol, nsticks) stick intensities
+        grid (np.array): (ngrid,) points to evaluate the spectra at
+        fwhm (float): Full width at half maximum of the lines
+        shape (str): gaussian or lorentzian [default: gaussian]
+        max_bytes (int): Memory budget of the work array [default: 64 MiB]
+
+    Returns:
+        spectra (np.array): (nmol, ngrid) broadened spectra
+
+    """
+    centers = np.atleast_2d(np.asarray(centers, dtype=float))
+    strengths = np.atleast_2d(np.asarray(strengths, dtype=float))
+    grid = np.asarray(grid, dtype=float)
+    nmol, nsticks = centers.shape
+    spectra = np.zeros((nmol, len(grid)))
+    if nsticks == 0:
+        return spectra
+    valid = np.isfinite(centers) & np.isfinite(strengths)
+    centers = np.where(valid, centers, 0.0)
+    strengths = np.where(valid, strengths, 0.0)
+    chunk = max(1, int(max_bytes // (8*nsticks*len(grid))))
+    for start in range(0, nmol, chunk):
+        stop = min(nmol, start + chunk)
+        lines = line_shape(grid[None,None,:] - centers[start:stop,:,None], fwhm, shape)
+        spectra[start:stop] = np.einsum("ms,msg->mg", strengths[start:stop], lines)
+    return spectra
+
+def broaden_uvvis(ev, f, grid, fwhm=0.3, shape="gaussian", unit="ev", max_bytes=2**26):
+    """Build broadened UV-Vis spectra from TD-DFT excitation energies
+
+    The lines are always broadened in energy; a wavelength grid is converted
+    to energies before the spectra are evaluated on it.
+
+    Args:
+        ev (np.array): (nmol, nstates) excitation energies in eV, NaN padded
+        f (np.array): (nmol, nstates) oscillator strengths
+        grid (np.array): The grid, in eV or nm
+        fwhm (float): Full width at half maximum in eV [default: 0.3]
+        shape (str): gaussian or lorentzian [default: gaussian]
+        unit (str): ev or nm, the unit of grid [default: ev]
+        max_bytes (int): Memory budget of the work array [default: 64 MiB]
+
+    Returns:
+        spectra (np.array): (nmol, ngrid) broadened spectra
+
+    """
+    grid = np.asarray(grid, dtype=float)
+    if unit == "nm":
+        grid = HC_EV_NM / grid
+    elif unit != "ev":
+        raise ValueError("Unknown grid unit %s" % unit)
+    return broaden(ev, f, grid, fwhm, shape=shape, max_bytes=max_bytes)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Broaden the excited states of a harvest.npz into UV-Vis spectra')
+    parser.add_argument('-f', type=str, default="harvest.npz", help='Harvested table from harvest.py [default: harvest.npz]')
+    parser.add_argument('-out', type=str, default="uvvis.npz", help='Output file [default: uvvis.npz]')
+    parser.add_argument('-fwhm', type=float, default=0.3, help='Full width at half maximum in eV [default: 0.3]')
+    parser.add_argument('-shape', type=str, default="gaussian", choices=["gaussian","lorentzian"], help='Line shape [default: gaussian]')
+    parser.add_argument('-unit', type=str, default="nm", choices=["ev","nm"], help='Unit of the grid [default: nm]')
+    parser.add_argument('-min', type=float, default=200.0, help='Lower end of the grid [default: 200]')
+    parser.add_argument('-max', type=float, default=800.0, help='Upper end of the grid [default: 800]')
+    parser.add_argument('-npts', type=int, default=1201, help='Number of grid points [default: 1201]')
+    parser.add_argument('-archive', type=str, default=None, help='Also append the spectra to this spectral archive [default: None]')
+    args = parser.parse_args(argv)
+
+    table = np.load(args.f)
+    grid = np.linspace(args.min, args.max, args.npts)
+    spectra = broaden_uvvis(table["ev"], table["f"], grid, fwhm=args.fwhm, shape=args.shape, unit=args.unit)
+    np.savez(args.out, molecule=table["molecule"], grid=grid, unit=args.unit, spectra=spectra)
+    if args.archive is not None:
+        spec_archive.append(args.archive, list(table["molecule"]), spectra, grid=grid)
+
+if __name__ == "__main__":
+    main()
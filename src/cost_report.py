@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+import argparse
+import csv
+import glob
+import json
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+import gauss_log
+import harvest
+import log_cache
+import profiling
+import workflow
+
+# Logs of every workflow step relative to a molecule directory. A step may
+# have several logs, e.g. one per NTO state; their costs are summed.
+COST_LOGS = {"geom_opt": ["ground_state_geom_opt/geom_opt.log"],
+             "vert_exc": ["vert_exc/vert_exc.log"],
+             "exc_geom": ["exc_geom/exc_geom.log"],
+             "exc_solv": ["exc_solv/exc_solv.log"],
+             "gs_sp": ["gs_sp/gs_sp.log"],
+             "nto": ["ntos/*/*.log", "ntos/*.log"],
+             "infrared": ["infrared/infrared.log"],
+             "raman": ["raman/raman.log"]}
+
+# Scale of the median absolute deviation of normally distributed values
+_MAD_SCALE = 1.4826
+
+def step_logs(path, step):
+    """Return the existing logs of one step of a molecule directory"""
+    logs = []
+    for pattern in COST_LOGS[step]:
+        logs += sorted(glob.glob(os.path.join(path, pattern)))
+    return logs
+
+def molecule_cost(path, cache=None):
+    """Collect the cost of every workflow step of one molecule directory
+
+    Args:
+        path (str): The molecule directory
+        cache (dict): Parse cache as used by log_cache, updated in place [default: None]
+
+    Returns:
+        cost (dict): Per step the summed cpu and elapsed seconds, the core
+            hours of the allocation (elapsed times processors), the number of
+            logs and their statuses; None for steps without logs
+
+    """
+    cost = {}
+    for step in COST_LOGS:
+        logs = step_logs(path, step)
+        if not logs:
+            cost[step] = None
+            continue
+        entry = {"cpu": 0.0, "elapsed": 0.0, "core_hours": 0.0, "logs": len(logs), "status": []}
+        for logfile in logs:
+            result = log_cache.cached_scan(cache, logfile) if cache is not None else gauss_log.scan_log(logfile)
+            entry["cpu"] += result["cpu"]
+            entry["elapsed"] += result["elapsed"]
+            entry["core_hours"] += result["elapsed"] * (result["nproc"] or 1) / 3600.0
+            entry["status"].append(gauss_log.status(result))
+        cost[step] = entry
+    return cost
+
+def campaign_cost(root, workers=None, cachefile=None):
+    """Collect the cost of every molecule directory of a campaign
+
+    With a cache file, unchanged logs are served from the cache and only
+    the logs that are new or changed are parsed in the pool, as in
+    harvest.harvest.
+
+    Args:
+        root (str): The top directory of the campaign
+        workers (int): Number of worker processes [default: os.cpu_count()]
+        cachefile (str): JSON parse cache to read and update [default: None]
+
+    Returns:
+        molecules (list): Paths of the molecule directories
+        costs (list): molecule_cost of every molecule
+
+    """
+    # A molecule directory holds the directory of any step, NTOs included
+    steps = workflow.ABSORPTION + workflow.SPECTRA + workflow.nto_batch_step([1])
+    molecules = harvest.find_molecules(root, logs=dict((step["name"], os.path.join(step["dir"], step["input"])) for step in steps))
+    if not molecules:
+        return [], []
+    nworkers = workers or os.cpu_count() or 1
+    if cachefile is not None:
+        cache = log_cache.load_cache(cachefile)
+        jobs = []
+        for path in molecules:
+            for step in COST_LOGS:
+                for logfile in step_logs(path, step):
+                    state, result = log_cache.lookup(cache, logfile)
+                    if state in ("miss", "grown"):
+                        jobs.append((logfile, result))
+        if jobs:
+            with Pool(nworkers) as pool:
+                for path, entry in pool.imap_unordered(log_cache.scan_entry, jobs, chunksize=max(1, len(jobs)//(8*nworkers))):
+                    cache[path] = entry
+        # Every log is in the cache now
+        costs = [molecule_cost(path, cache) for path in molecules]
+        log_cache.save_cache(cache, cachefile)
+        return molecules, costs
+    with Pool(nworkers) as pool:
+        costs = pool.map(molecule_cost, molecules, chunksize=max(1, len(molecules)//(8*nworkers)))
+    return molecules, costs
+
+def outliers(values, threshold=3.5):
+    """Flag values far above the bulk by their robust z-score
+
+    The z-score uses the median and the median absolute deviation, so a few
+    runaway jobs do not hide each other the way they would with the mean and
+    standard deviation.
+
+    Args:
+        values (np.array): Values, NaN for missing ones
+        threshold (float): Robust z-score above which a value is an outlier [default: 3.5]
+
+    Returns:
+        z (np.array): The robust z-score of every value, NaN for missing ones
+        flags (np.array): True for the outliers
+
+    """
+    values = np.asarray(values, dtype=float)
+    z = np.full(len(values), np.nan)
+    known = ~np.isnan(values)
+    if np.sum(known) < 3:
+        return z, np.zeros(len(values), dtype=bool)
+    median = np.median(values[known])
+    mad = _MAD_SCALE * np.median(np.abs(values[known] - median))
+    if mad == 0:
+        mad = max(1e-12, 1e-3 * abs(median))
+    z[known] = (values[known] - median) / mad
+    return z, np.nan_to_num(z) > threshold
+
+def report(molecules, costs, root=".", threshold=3.5, profile=None):
+    """Summarize where the core hours of a campaign went
+
+    Args:
+        molecules (list): Paths of the molecule directories
+        costs (list): molecule_cost of every molecule
+        root (str): Molecule paths are reported relative to this directory [default: .]
+        threshold (float): Robust z-score above which a molecule is an outlier [default: 3.5]
+        profile (list): Records of profiled tool calls to set against the
+            Gaussian times, see profiling.load_trace [default: None]
+
+    Returns:
+        summary (dict): Per step the molecule count, total and median core
+            hours, cpu hours, parallel efficiency, share of the campaign and the
+            outlier molecules; the campaign total and, with profile, the
+            summary of the tool calls
+
+    """
+    names = [os.path.relpath(path, root) for path in molecules]
+    total = sum(entry["core_hours"] for cost in costs for entry in cost.values() if entry is not None)
+    steps = {}
+    for step in COST_LOGS:
+        core_hours = np.array([np.nan if cost[step] is None else cost[step]["core_hours"] for cost in costs])
+        known = ~np.isnan(core_hours)
+        if not np.any(known):
+            continue
+        entries = [cost[step] for cost in costs if cost[step] is not None]
+        cpu_hours = sum(entry["cpu"] for entry in entries) / 3600.0
+        z, flags = outliers(core_hours, threshold=threshold)
+        steps[step] = {"molecules": int(np.sum(known)),
+                       "core_hours": float(np.sum(core_hours[known])),
+                       "median_core_hours": float(np.median(core_hours[known])),
+                       "cpu_hours": cpu_hours,
+                       "efficiency": cpu_hours / float(np.sum(core_hours[known])) if np.sum(core_hours[known]) > 0 else 0.0,
+                       "share": float(np.sum(core_hours[known])) / total if total > 0 else 0.0,
+                       "failed": sum(entry["status"].count("failed") for entry in entries),
+                       "outliers": [{"molecule": names[i], "core_hours": float(core_hours[i]), "z": float(z[i])}
+                                    for i in np.argsort(-np.nan_to_num(z)) if flags[i]]}
+    summary = {"molecules": len(molecules), "core_hours": total, "steps": steps}
+    if profile is not None:
+        summary["tools"] = profiling.summary(profile)
+    return summary
+
+def print_report(summary):
+    print("%d molecules, %.1f core hours" % (summary["molecules"], summary["core_hours"]))
+    print("%-10s %6s %12s %10s %10s %7s %7s %7s %9s" % ("step", "mols", "core hours", "median", "cpu hours", "eff", "share", "failed", "outliers"))
+    for step, s in sorted(summary["steps"].items(), key=lambda item: -item[1]["core_hours"]):
+        print("%-10s %6d %12.1f %10.2f %10.1f %7.2f %6.1f%% %7d %9d" % (step, s["molecules"], s["core_hours"], s["median_core_hours"],
+              s["cpu_hours"], s["efficiency"], 100*s["share"], s["failed"], len(s["outliers"])))
+    for step, s in summary["steps"].items():
+        for out in s["outliers"]:
+            print("outlier %-10s %-40s %10.2f core hours (z=%.1f)" % (step, out["molecule"], out["core_hours"], out["z"]))
+    if "tools" in summary:
+        print()
+        profiling.print_summary(summary["tools"])
+
+def write_costs(molecules, costs, filename, root="."):
+    """Write the core hours of every molecule and step to a CSV file"""
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["molecule"] + ["%s_core_hours" % step for step in COST_LOGS] + ["%s_elapsed" % step for step in COST_LOGS])
+        for path, cost in zip(molecules, costs):
+            line = [os.path.relpath(path, root)]
+            line += ["" if cost[step] is None else "%.4f" % cost[step]["core_hours"] for step in COST_LOGS]
+            line += ["" if cost[step] is None else "%.1f" % cost[step]["elapsed"] for step in COST_LOGS]
+            writer.writerow(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Report which workflow steps and molecules use the core hours of a campaign')
+    parser.add_argument('-root', type=str, default=".", help='Top directory of the campaign [default: .]')
+    parser.add_argument('-out', type=str, default="cost", help='Output prefix for the .csv and .json reports [default: cost]')
+    parser.add_argument('-workers', type=int, default=None, help='Number of worker processes [default: all cores]')
+    parser.add_argument('-cache', type=str, default=None, help='Parse cache file to reuse results of unchanged logs [default: None]')
+    parser.add_argument('-threshold', type=float, default=3.5, help='Robust z-score above which a molecule is an outlier [default: 3.5]')
+    parser.add_argument('-profile', type=str, default=None, help='Trace file of the tools (GAUSS_PROFILE) to include [default: None]')
+    args = parser.parse_args(argv)
+
+    molecules, costs = campaign_cost(args.root, workers=args.workers, cachefile=args.cache)
+    profile = profiling.load_trace(args.profile) if args.profile is not None else None
+    summary = report(molecules, costs, root=args.root, threshold=args.threshold, profile=profile)
+    write_costs(molecules, costs, args.out + ".csv", root=args.root)
+    with open(args.out + ".json", "w") as f:
+        json.dump(summary, f, indent=1)
+    print_report(summary)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+
+import gauss_log
+
+def parse_gjf(filename):
+    """Split a gaussian input file into the parts that define the calculation
+
+    Args:
+        filename (str): The .gjf file
+
+    Returns:
+        link0 (dict): Link 0 commands, e.g. {"chk": "vert_exc.chk"}, keys lower case
+        route (str): The route section joined into one line
+        charge_mult (str): The charge and multiplicity line
+        geometry (list): The geometry lines, empty for Geom=Check inputs
+
+    """
+    with open(filename,"r") as f:
+        lines = [line.rstrip("\n") for line in f]
+    link0 = {}
+    i = 0
+    while i < len(lines) and lines[i].startswith("%"):
+        key, _, value = lines[i][1:].partition("=")
+        link0[key.strip().lower()] = value.strip()
+        i += 1
+    route = []
+    while i < len(lines) and lines[i].strip():
+        route.append(lines[i].strip())
+        i += 1
+    # Skip the blank line, the title section and the blank line after it
+    i += 1
+    while i < len(lines) and lines[i].strip():
+        i += 1
+    i += 1
+    charge_mult = lines[i].strip() if i < len(lines) else ""
+    geometry = []
+    for line in lines[i+1:]:
+        if not line.strip():
+            break
+        geometry.append(line.strip())
+    return link0, " ".join(route), charge_mult, geometry
+
+def normalize_route(route):
+    """Normalize a route line so that equivalent routes compare equal
+
+    Case, the #n/#p/#t print level, spacing and keyword order are ignored.
+    """
+    route = re.sub(r"^#[npt]?\s*", "", route.strip().lower())
+    route = re.sub(r"\s*([=,()/])\s*", r"\1", route)
+    return " ".join(sorted(route.split()))
+
+def normalize_geometry(geometry):
+    """Normalize geometry lines to element symbols and coordinates rounded to 1e-4 Angstrom
+
+    Lines that are not cartesian coordinates, e.g. z-matrix entries, are kept
+    with their spacing normalized.
+    """
+    atoms = []
+    for line in geometry:
+        vals = line.split()
+        try:
+            coords = ["%.4f" % float(v) for v in vals[-3:]]
+        except ValueError:
+            atoms.append(" ".join(vals))
+            continue
+        coords = ["0.0000" if c == "-0.0000" else c for c in coords]
+        atoms.append(" ".join([vals[0].capitalize()] + coords))
+    return atoms
+
+def fingerprint_gjf(filename):
+    """Fingerprint the calculation a gaussian input file describes
+
+    The fingerprint hashes the normalized route, the charge and
+    multiplicity and the geometry. Inputs that take their geometry from an
+    %oldchk also include the fingerprint of the input in the checkpoint's
+    directory, so a step is only identical to another if the whole chain of
+    steps leading to it is.
+
+    Args:
+        filename (str): The .gjf file
+
+    Returns:
+        fingerprint (str): Hex digest identifying the calculation
+
+    """
+    link0, route, charge_mult, geometry = parse_gjf(filename)
+    digest = hashlib.sha256()
+    digest.update(normalize_route(route).encode())
+    digest.update(b"\n" + " ".join(charge_mult.split()).encode())
+    for atom in normalize_geometry(geometry):
+        digest.update(b"\n" + atom.encode())
+    if "oldchk" in link0:
+        parent_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), os.path.dirname(link0["oldchk"]))
+        parents = sorted(glob.glob(os.path.join(parent_dir, "*.gjf")))
+        digest.update(b"\nparent ")
+        digest.update(fingerprint_gjf(parents[0]).encode() if parents else link0["oldchk"].encode())
+    return digest.hexdigest()
+
+def outputs(filename):
+    """Return the log and checkpoint a gaussian input file produces"""
+    link0 = parse_gjf(filename)[0]
+    directory = os.path.dirname(os.path.abspath(filename))
+    log = os.path.splitext(os.path.abspath(filename))[0] + ".log"
+    chk = os.path.join(directory, link0["chk"]) if "chk" in link0 else None
+    return log, chk
+
+def load_store(storefile):
+    """Load the fingerprint store, returning an empty one if the file does not exist"""
+    if not os.path.isfile(storefile):
+        return {}
+    with open(storefile,"r") as f:
+        return json.load(f)
+
+def save_store(store, storefile):
+    tmp = "%s.%d.tmp" % (storefile, os.getpid())
+    with open(tmp,"w") as f:
+        json.dump(store, f, indent=1)
+    os.replace(tmp, storefile)
+
+def register(store, root):
+    """Add every finished calculation below root to the fingerprint store
+
+    A calculation counts as finished when its log terminated normally and its
+    checkpoint exists. Symlinked (reused) logs are not registered again.
+
+    Args:
+        store (dict): Finished calculations keyed by fingerprint, updated in place
+        root (str): The directory to search for .gjf files
+
+    Returns:
+        added (int): The number of new entries
+
+    """
+    added = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            if not name.endswith(".gjf"):
+                continue
+            gjf = os.path.join(dirpath, name)
+            log, chk = outputs(gjf)
+            if os.path.islink(log) or not os.path.isfile(log) or chk is None or not os.path.isfile(chk):
+                continue
+            if not gauss_log.terminated(gauss_log.scan_log(log)):
+                continue
+            fingerprint = fingerprint_gjf(gjf)
+            if fingerprint not in store:
+                store[fingerprint] = {"log": log, "chk": chk}
+                added += 1
+    return added
+
+def reuse(store, gjf):
+    """Symlink the finished outputs of an identical calculation next to an input
+
+    Args:
+        store (dict): Finished calculations keyed by fingerprint
+        gjf (str): The .gjf file of the new calculation
+
+    Outputs of a real run are never replaced: if the input already has its
+    own log or checkpoint nothing is linked in, unless they are the very
+    files in the store, as when a registered campaign is generated again.
+
+    Returns:
+        reused (bool): True if the log and checkpoint were linked in or are
+            already the stored ones
+
+    """
+    entry = store.get(fingerprint_gjf(gjf))
+    if entry is None or not os.path.isfile(entry["log"]) or not os.path.isfile(entry["chk"]):
+        return False
+    log, chk = outputs(gjf)
+    pairs = [(target, link) for target, link in [(entry["log"], log), (entry["chk"], chk)]
+             if os.path.realpath(target) != os.path.realpath(link)]
+    if any(os.path.exists(link) and not os.path.islink(link) for target, link in pairs):
+        return False
+    for target, link in pairs:
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(target, link)
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Register finished gaussian calculations for reuse by the generators')
+    parser.add_argument('-store', type=str, default="calc_store.json", help='Fingerprint store file [default: calc_store.json]')
+    parser.add_argument('-register', type=str, default=".", help='Directory of finished calculations to register [default: .]')
+    args = parser.parse_args(argv)
+
+    store = load_store(args.store)
+    print("Registered %d calculations" % register(store, args.register))
+    save_store(store, args.store)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+import sys
+
+# Subcommands of gauss and the module whose main() runs them. A module is
+# only imported when its subcommand is used, so that quick commands do not
+# pay for NumPy or matplotlib.
+COMMANDS = {
+    "gen": ("gen_gaussian", "Generate gaussian input files for absorption/emission calculations"),
+    "ntos": ("gen_ntos", "Generate the natural transition orbital calculations"),
+    "grab": ("grab_gaussian", "Print the absorption and emission wavelengths of a molecule directory"),
+    "emission": ("grab_emission", "Grab the spectra of a band shape calculation"),
+    "harvest": ("harvest", "Harvest absorption/emission results of a campaign"),
+    "freq": ("grab_freq", "Harvest and broaden the IR/Raman spectra of a campaign"),
+    "broaden": ("broaden", "Broaden harvested excitations into UV/Vis spectra"),
+    "geom": ("geometry", "Extract the final or every geometry of a log as XYZ"),
+    "monitor": ("monitor", "Follow the progress of running calculations"),
+    "submit": ("submit", "Run the SGE array jobs of a batch locally"),
+    "restart": ("restart", "Find failed steps and write restart jobs for them and the steps after them"),
+    "sizing": ("sizing", "Record the run history used to size jobs"),
+    "dedup": ("dedup", "Register finished calculations for reuse"),
+    "archive": ("spec_archive", "List or export the spectra of a spectral archive"),
+    "cost": ("cost_report", "Report which steps and molecules use the core hours of a campaign"),
+    "profile": ("profiling", "Summarize a trace file written with GAUSS_PROFILE"),
+}
+
+def usage():
+    lines = ["usage: gauss <command> [options]", "", "commands:"]
+    for name, (module, description) in COMMANDS.items():
+        lines.append("  %-10s %s" % (name, description))
+    lines += ["", "Run gauss <command> -h for the options of a command."]
+    return "\n".join(lines)
+
+def main(argv=None):
+    """Run a gauss subcommand
+
+    Args:
+        argv (list): The command line without the program name [default: sys.argv[1:]]
+
+    Returns:
+        status (int): The exit status
+
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    if argv[0] not in COMMANDS:
+        sys.stderr.write("gauss: unknown command %s\n\n%s\n" % (argv[0], usage()))
+        return 2
+    module = __import__(COMMANDS[argv[0]][0])
+    # argparse names the program after argv[0] in its usage and error messages
+    sys.argv[0] = "gauss %s" % argv[0]
+    status = module.main(argv[1:])
+    return status if isinstance(status, int) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
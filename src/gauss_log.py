@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+import mmap
+import os
+import re
+
+import profiling
+
+# Every quantity the grab_* tools need, matched in a single pass over the log.
+# The file is memory mapped so the scan never holds more than a few pages of a
+# large log in memory at once.
+_PATTERNS = [
+    ("scf", rb"^ SCF Done:\s+E\(\S+\)\s+=\s+(\S+)"),
+    ("state", rb"^ Excited State\s+(\d+):\s+(\S+)\s+(\S+)\s+eV\s+(\S+)\s+nm\s+f=(\S+)"),
+    ("trans", rb"^\s+(\d+[AB]?)\s*(->|<-)\s*(\d+[AB]?)\s+(\S+)[ \t]*$"),
+    ("corrected", rb"^ Total energy after correction\s+=\s+(\S+)"),
+    ("nbasis", rb"^\s+(\d+) basis functions,"),
+    ("nproc", rb"^ Will use up to\s+(\d+) processors"),
+    ("cpu", rb"^ Job cpu time:\s+(\d+) days\s+(\d+) hours\s+(\d+) minutes\s+(\S+) seconds"),
+    ("elapsed", rb"^ Elapsed time:\s+(\d+) days\s+(\d+) hours\s+(\d+) minutes\s+(\S+) seconds"),
+    ("normal", rb"^ Normal termination of Gaussian"),
+    ("error", rb"^ Error termination"),
+]
+
+_SCANNER = re.compile(b"|".join(b"(?P<%s>%s)" % (name.encode(), pat) for name, pat in _PATTERNS), re.MULTILINE)
+
+# Offsets of the capture groups belonging to each named alternative.
+_GROUPS = {}
+for _name, _pat in _PATTERNS:
+    _start = _SCANNER.groupindex[_name]
+    _GROUPS[_name] = tuple(range(_start + 1, _start + 1 + re.compile(_pat).groups))
+
+
+def new_result():
+    """Return an empty scan result
+
+    Returns:
+        result (dict): Empty containers for every quantity gathered by scan_log
+
+    """
+    return {"scf": [], "states": [], "corrected": None, "nbasis": None, "nproc": None,
+            "cpu": 0.0, "elapsed": 0.0, "normal": 0, "error": False, "offset": 0}
+
+
+@profiling.profiled
+def scan_log(logfile, result=None):
+    """Scan a gaussian log file once and collect everything the grab tools need
+
+    The log is memory mapped and searched with a single combined regular
+    expression, so memory use does not grow with the size of the file. Only
+    complete lines are consumed; the offset just past the last newline is
+    stored in the result so that a log which is still being written can be
+    scanned again from that point by passing the previous result back in.
+
+    Args:
+        logfile (str): The name of the log file to scan.
+        result (dict): A previous result of scan_log to continue from [default: None]
+
+    Returns:
+        result (dict): The scanned quantities with keys
+            scf (list): Every SCF Done energy in Hartrees
+            states (list): One dict per Excited State block with the keys
+                state, mult, ev, nm, f and trans (a list of [from, arrow, to, coef])
+            corrected (float): The last Total energy after correction, or None
+            nbasis (int): The number of basis functions, or None
+            nproc (int): The number of processors used, or None
+            cpu (float): Job cpu time summed over all links in seconds
+            elapsed (float): Elapsed time summed over all links in seconds
+            normal (int): The number of Normal termination lines
+            error (bool): True if an Error termination line was found
+            offset (int): The byte offset up to which the log was scanned
+
+    """
+    if result is None:
+        result = new_result()
+    size = os.path.getsize(logfile)
+    if size <= result["offset"]:
+        return result
+    with open(logfile, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = mm.rfind(b"\n", result["offset"]) + 1
+            if end <= result["offset"]:
+                return result
+            matches = _consume(mm, result["offset"], end, result)
+            profiling.count(bytes=end - result["offset"], matches=matches)
+            result["offset"] = end
+    return result
+
+
+def _consume(buf, start, end, result):
+    """Apply every match between start and end to result and return their number"""
+    states = result["states"]
+    matches = 0
+    for match in _SCANNER.finditer(buf, start, end):
+        matches += 1
+        kind = match.lastgroup
+        vals = [match.group(i).decode() for i in _GROUPS[kind]]
+        if kind == "scf":
+            result["scf"].append(_to_float(vals[0]))
+        elif kind == "state":
+            states.append({"state": int(vals[0]), "mult": vals[1], "ev": _to_float(vals[2]),
+                           "nm": _to_float(vals[3]), "f": _to_float(vals[4]), "trans": []})
+        elif kind == "trans":
+            if states:
+                states[-1]["trans"].append([vals[0], vals[1], vals[2], _to_float(vals[3])])
+        elif kind == "corrected":
+            result["corrected"] = _to_float(vals[0])
+        elif kind == "nbasis":
+            result["nbasis"] = int(vals[0])
+        elif kind == "nproc":
+            result["nproc"] = int(vals[0])
+        elif kind == "cpu" or kind == "elapsed":
+            result[kind] += ((int(vals[0])*24 + int(vals[1]))*60 + int(vals[2]))*60 + float(vals[3])
+        elif kind == "normal":
+            result["normal"] += 1
+        elif kind == "error":
+            result["error"] = True
+    return matches
+
+
+def _to_float(value):
+    return float(value.replace("D", "E"))
+
+
+def last_states(result):
+    """Return the Excited State blocks of the last TD calculation in a result
+
+    Optimizations and multi-link jobs print a block of excited states for every
+    step; only the final block describes the converged structure.
+
+    Args:
+        result (dict): A result of scan_log
+
+    Returns:
+        states (list): The Excited State dicts of the last block
+
+    """
+    states = result["states"]
+    for i in range(len(states) - 1, 0, -1):
+        if states[i]["state"] <= states[i - 1]["state"]:
+            return states[i:]
+    return states
+
+
+def terminated(result):
+    """Return True if the scanned log finished without an error"""
+    return result["normal"] > 0 and not result["error"]
+
+
+def status(result, links=1):
+    """Classify a scanned log
+
+    Args:
+        result (dict): A result of scan_log, or None if the log does not exist
+        links (int): The number of links the job runs, each of which ends in
+            its own Normal termination, e.g. 2 for opt freq [default: 1]
+
+    Returns:
+        status (str): missing, failed, done or incomplete
+
+    """
+    if result is None:
+        return "missing"
+    if result["error"]:
+        return "failed"
+    if result["normal"] >= links:
+        return "done"
+    return "incomplete"
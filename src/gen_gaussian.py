@@ -1,200 +1,127 @@
 #!/usr/bin/env python
-import numpy as np
 import argparse
 import os
+import glob
+import itertools
+from functools import partial
+import submit
+import sizing
+import dedup
+import profiling
+import workflow
 
-def gen_header(nproc, oldchk, chk, mem):
-    """Generate gaussian input file header"""
-    line1="%%NProcShared=%d" % nproc
-    if oldchk is not None:
-        line2="%%oldchk=%s" % oldchk
-    line3="%%chk=%s" % chk
-    line4="%%mem=%dGB" % mem
-    header = []
-    if oldchk is not None:
-        header = [line1, line2, line3, line4]
-    else:
-        header = [line1, line3, line4]
+def gen_gs_geom_opt(coords, path=".", **kwargs):
+    """Generate gaussian input file for geometry optimization"""
+    workflow.gen_step(workflow.STEPS["geom_opt"], coords=coords, path=path, **kwargs)
 
-    return header
+def gen_vert_exc(nstates=6, path=".", **kwargs):
+    workflow.gen_step(workflow.STEPS["vert_exc"], nstates=nstates, path=path, **kwargs)
 
-def gen_gs_geom_opt(coords, functional="B3LYP", basis="6-31(d,p)", dispersion=1, solv_model="PCM", solvent="Methanol", charge=0, multiplicity=1, nproc=28,mem=100):
-    """Generate gaussian input file for geometry optimization"""
+def gen_exc_geom(nstates=6, path=".", **kwargs):
+    workflow.gen_step(workflow.STEPS["exc_geom"], nstates=nstates, path=path, **kwargs)
+
+def gen_exc_solv(nstates=6, path=".", **kwargs):
+    workflow.gen_step(workflow.STEPS["exc_solv"], nstates=nstates, path=path, **kwargs)
+
+def gen_gs_sp(path=".", **kwargs):
+    workflow.gen_step(workflow.STEPS["gs_sp"], path=path, **kwargs)
 
-    header = gen_header(nproc, None, "ground_state_geom_opt.chk", mem)
-    os.makedirs("ground_state_geom_opt",exist_ok=True)
-    with open("ground_state_geom_opt/geom_opt.gjf","w") as f:
-        for line in header:
-            f.write(line+"\n")
-        if dispersion == 1:
-            f.write("#n %s/%s empiricaldispersion=gd3 opt freq SCRF=(%s,Solvent=%s)\n" % (functional, basis, solv_model,solvent))
-        else:
-            f.write("#n %s/%s opt freq SCRF=(%s,Solvent=%s)\n" % (functional, basis, solv_model, solvent))
-        f.write("\n")
-        f.write("Ground state geometry optimization\n")
-        f.write("\n")
-        f.write("%d %d\n" % (charge, multiplicity))
-        for coord in coords:
-            f.write("%s\n" % (coord))
-        f.write("\n")
-
-def gen_vert_exc(nstates=6, functional="B3LYP", basis="6-31(d,p)", dispersion=1, solv_model="PCM", solvent="Methanol", charge=0, multiplicity=1, nproc=28,mem=100):
-    header = gen_header(nproc, "../ground_state_geom_opt/ground_state_geom_opt.chk", "vert_exc.chk", mem)
-    os.makedirs("vert_exc",exist_ok=True)
-    with open("vert_exc/vert_exc.gjf","w") as f:
-        for line in header:
-            f.write(line+"\n")
-        if dispersion == 1:
-            f.write("#n %s/%s empiricaldispersion=gd3 TD=(Nstates=%d,Root=1) Geom=Check Guess=Read SCRF=(%s,Solvent=%s,CorrectedLR)\n" % (functional, basis, nstates, solv_model, solvent))
-        else:
-            f.write("#n %s/%s TD=(Nstates=%d,Root=1) Geom=Check Guess=Read SCRF=(%s,Solvent=%s,CorrectedLR)\n" % (functional, basis, nstates, solv_model, solvent))
-        f.write("\n")
-        f.write("Excited state corrected LR calculation\n")
-        f.write("\n")
-        f.write("%d %d\n" % (charge, multiplicity))
-
-def gen_exc_geom(nstates=6, functional="B3LYP", basis="6-31(d,p)", dispersion=1, solv_model="PCM", solvent="Methanol", charge=0, multiplicity=1, nproc=28,mem=100):
-    header = gen_header(nproc, "../vert_exc/vert_exc.chk", "exc_geom.chk", mem)
-    os.makedirs("exc_geom",exist_ok=True)
-    with open("exc_geom/exc_geom.gjf","w") as f:
-        for line in header:
-            f.write(line+"\n")
-        if dispersion == 1:
-            f.write("#n %s/%s empiricaldispersion=gd3 TD=(Nstates=%d,Root=1) Geom=Check Guess=Read SCRF=(%s, Solvent=%s)  opt=CalcFC Freq NoSymm\n" % (functional, basis, nstates, solv_model, solvent))
-        else:
-            f.write("#n %s/%s TD=(Nstates=%d,Root=1) Geom=Check Guess=Read SCRF=(%s,Solvent=%s) opt=CalcFC Freq NoSymm\n" % (functional, basis, nstates, solv_model, solvent))
-        f.write("\n")
-        f.write("Excited state geometry optimization calculation\n")
-        f.write("\n")
-        f.write("%d %d\n" % (charge, multiplicity))
-
-def gen_exc_solv(nstates=6, functional="B3LYP", basis="6-31(d,p)", dispersion=1, solv_model="PCM", solvent="Methanol", charge=0, multiplicity=1, nproc=28,mem=100):
-    header = gen_header(nproc, "../exc_geom/exc_geom.chk", "exc_solv.chk", mem)
-    os.makedirs("exc_solv",exist_ok=True)
-    with open("exc_solv/exc_solv.gjf","w") as f:
-        for line in header:
-            f.write(line+"\n")
-        if dispersion == 1:
-            f.write("#n %s/%s empiricaldispersion=gd3 TD=(Nstates=%d,Root=1) Geom=Check Guess=Read SCRF=(%s,Solvent=%s,CorrectedLR,NonEquilibrium=Save)  NoSymm\n" % (functional, basis, nstates, solv_model, solvent))
-        else:
-            f.write("#n %s/%s TD=(Nstates=%d,Root=1) Geom=Check Guess=Read SCRF=(%s,Solvent=%s,CorrectedLR,NonEquilibrium=Save) NoSymm\n" % (functional, basis, nstates, solv_model, solvent))
-        f.write("\n")
-        f.write("Excited state solvent field calculation\n")
-        f.write("\n")
-        f.write("%d %d\n" % (charge, multiplicity))
-
-def gen_gs_sp(functional="B3LYP", basis="6-31(d,p)", dispersion=1, solv_model="PCM", solvent="Methanol", charge=0, multiplicity=1, nproc=28,mem=100):
-    header=gen_header(nproc, "../exc_solv/exc_solv.chk", "gs_sp.chk", mem)
-    os.makedirs("gs_sp",exist_ok=True)
-    with open("gs_sp/gs_sp.gjf","w") as f:
-        for line in header:
-            f.write(line+"\n")
-        if dispersion == 1:
-            f.write("#n %s/%s empiricaldispersion=gd3 Geom=Check Guess=Read SCRF=(%s,Solvent=%s,NonEquilibrium=Read) NoSymm\n" %(functional, basis, solv_model, solvent))
-        else:
-            f.write("#n %s/%s Geom=Check Guess=Read SCRF=(%s,Solvent=%s,NonEquilibrium=Read) NoSymm\n"% (functional, basis, solv_model, solvent))
-        f.write("\n")
-        f.write("Ground state single point calculation\n")
-        f.write("\n")
-        f.write("%d %d\n" % (charge, multiplicity))
+# Writing inputs only needs the coordinate lines checked and reformatted, so
+# they are parsed here without geometry.py, which would import NumPy
+def _atom_lines(lines, filename, linenos):
+    """Check "element x y z" lines and format them as in geometry.to_lines"""
+    atoms = []
+    for lineno, line in zip(linenos, lines):
+        vals = line.split()
+        try:
+            if len(vals) < 4 or not (vals[0].isalpha() or vals[0].isdigit()):
+                raise ValueError
+            atoms.append("%-2s %15.8f %15.8f %15.8f" % ((vals[0].capitalize(),) + tuple(float(v) for v in vals[1:4])))
+        except ValueError:
+            raise ValueError("%s:%d: expected 'element x y z', got %r" % (filename, lineno, line.rstrip("\n")))
+    return atoms
 
 def read_coords(filename):
-    with open(filename,"r") as f:
-        lines = f.readlines()
-        coords = []
-        for line in lines:
-            if line[0] != "#":
-                coords.append(line.strip())
-    return coords
+    """Read a plain coordinates file of "element x y z" lines as coordinate lines
+
+    Blank lines and lines starting with # or ! are skipped, as in
+    geometry.read_coords.
+    """
+    with open(filename, "r") as f:
+        atoms = [(i+1, line) for i, line in enumerate(f) if line.strip() and line.lstrip()[0] not in "#!"]
+    return _atom_lines([line for i, line in atoms], filename, [i for i, line in atoms])
 
 def read_xyz(filename):
-    with open(filename,"r") as f:
+    """Read the first frame of an .xyz file as coordinate lines"""
+    with open(filename, "r") as f:
         lines = f.readlines()
-        coords = []
-        for line in lines[2:]:
-            coords.append(line.strip())
-    return coords
+    start = 0
+    while start < len(lines) and not lines[start].strip():
+        start += 1
+    if start == len(lines):
+        raise ValueError("%s holds no geometry" % filename)
+    try:
+        natoms = int(lines[start])
+    except ValueError:
+        raise ValueError("%s:%d: expected the number of atoms, got %r" % (filename, start+1, lines[start].rstrip("\n")))
+    atoms = lines[start+2:start+2+natoms]
+    if len(atoms) < natoms:
+        raise ValueError("%s:%d: frame has %d of %d atoms" % (filename, start+1, len(atoms), natoms))
+    return _atom_lines(atoms, filename, range(start+3, start+3+natoms))
 
-def gen_sub_script(solvent,nproc=28,functional="B3LYP"):
-    with open("sub_script.sh","w") as f:
+# Step directories and inputs of the absorption/emission chain, in run order
+ABSORPTION_INPUTS = [(step["dir"], step["input"]) for step in workflow.ABSORPTION]
+
+@profiling.profiled
+def gen_sub_script(solvent,nproc=28,functional="B3LYP",path=".",h_rt="12:00:00",mem_per_core="4G",skip=()):
+    with open(os.path.join(path, "sub_script.sh"),"w") as f:
         f.write("#!/bin/bash\n")
         f.write("#\n")
         f.write("#$ -N %s-%s\n" % (solvent[:4],functional))
         f.write("#$ -j y\n")
-        f.write("#$ -l h_rt=12:00:00\n")
+        f.write("#$ -l h_rt=%s\n" % h_rt)
         f.write("#$ -pe mpi_28_tasks_per_node %d\n" % nproc)
-        f.write("#$ -l mem_per_core=4G\n")
+        f.write("#$ -l mem_per_core=%s\n" % mem_per_core)
         f.write("#$ -V\n")
 
         f.write("module load gaussian/16.C.01\n")
-        f.write("cd ground_state_geom_opt\n")
-        f.write("g16 geom_opt.gjf\n")
-        f.write("cd ../vert_exc\n")
-        f.write("g16 vert_exc.gjf\n")
-        f.write("cd ../exc_geom\n")
-        f.write("g16 exc_geom.gjf\n")
-        f.write("cd ../exc_solv\n")
-        f.write("g16 exc_solv.gjf\n")
-        f.write("cd ../gs_sp\n")
-        f.write("g16 gs_sp.gjf\n")
-
-def gen_ir(coords, molecule, functional="B3LYP", basis="6-31(d,p)", dispersion=1, solv_model="PCM", solvent="Methanol", charge=0, multiplicity=1, nproc=28, mem=100):
+        # Every step reads the checkpoint of the one before, stop at the first failure
+        f.write("set -e\n")
+        for i, (step, gjf) in enumerate(ABSORPTION_INPUTS):
+            f.write("cd %s%s\n" % ("" if i == 0 else "../", step))
+            if step not in skip:
+                f.write("g16 %s\n" % gjf)
+    profiling.count(files=1)
+
+def gen_ir(coords, molecule, **kwargs):
     """Generate gaussian input file for IR calculation"""
+    workflow.gen_step(workflow.STEPS["infrared"], coords=coords, path=molecule, **kwargs)
 
-    header = gen_header(nproc, None, "infrared.chk", mem)
-    os.makedirs("%s/infrared"%molecule,exist_ok=True)
-    with open("%s/infrared/infrared.gjf"%molecule,"w") as f:
-        for line in header:
-            f.write(line+"\n")
-        if dispersion == 1:
-            f.write("#n %s/%s empiricaldispersion=gd3 opt freq SCRF=(%s,Solvent=%s)\n" % (functional, basis, solv_model,solvent))
-        else:
-            f.write("#n %s/%s opt freq SCRF=(%s,Solvent=%s)\n" % (functional, basis, solv_model, solvent))
-        f.write("\n")
-        f.write("Ground state geometry optimization\n")
-        f.write("\n")
-        f.write("%d %d\n" % (charge, multiplicity))
-        for coord in coords:
-            f.write("%s\n" % (coord))
-        f.write("\n")
-
-def gen_raman(coords, molecule, functional="B3LYP", basis="6-31(d,p)", dispersion=1, solv_model="PCM", solvent="Methanol", charge=0, multiplicity=1, nproc=28, mem=100):
+def gen_raman(coords, molecule, **kwargs):
     """Generate gaussian input file for Raman calculation"""
+    workflow.gen_step(workflow.STEPS["raman"], coords=coords, path=molecule, **kwargs)
 
-    header = gen_header(nproc, None, "raman.chk", mem)
-    os.makedirs("%s/raman"%molecule,exist_ok=True)
-    with open("%s/raman/raman.gjf"%molecule,"w") as f:
-        for line in header:
-            f.write(line+"\n")
-        if dispersion == 1:
-            f.write("#n %s/%s empiricaldispersion=gd3 opt freq=Raman SCRF=(%s,Solvent=%s)\n" % (functional, basis, solv_model,solvent))
-        else:
-            f.write("#n %s/%s opt freq=Raman SCRF=(%s,Solvent=%s)\n" % (functional, basis, solv_model, solvent))
-        f.write("\n")
-        f.write("Ground state geometry optimization\n")
-        f.write("\n")
-        f.write("%d %d\n" % (charge, multiplicity))
-        for coord in coords:
-            f.write("%s\n" % (coord))
-        f.write("\n")
-
-def gen_spec_script(solvent, molecule, nproc=28, functional="B3LYP"):
+@profiling.profiled
+def gen_spec_script(solvent, molecule, nproc=28, functional="B3LYP", h_rt="12:00:00", mem_per_core="4G", skip=()):
     with open("%s/sub_script.sh"%molecule,"w") as f:
         f.write("#!/bin/bash\n")
         f.write("#\n")
-        f.write("#$ -N ir-%s\n" % (molecule))
+        f.write("#$ -N ir-%s\n" % (os.path.basename(molecule)))
         f.write("#$ -j y\n")
-        f.write("#$ -l h_rt=12:00:00\n")
+        f.write("#$ -l h_rt=%s\n" % h_rt)
         f.write("#$ -pe mpi_28_tasks_per_node %d\n" % nproc)
-        f.write("#$ -l mem_per_core=4G\n")
+        f.write("#$ -l mem_per_core=%s\n" % mem_per_core)
         f.write("#$ -V\n")
 
         f.write("module load gaussian/16.C.01\n")
         f.write("cd infrared\n")
-        f.write("g16 infrared.gjf\n")
+        if "infrared" not in skip:
+            f.write("g16 infrared.gjf\n")
         f.write("cd ../raman\n")
-        f.write("g16 raman.gjf\n")
+        if "raman" not in skip:
+            f.write("g16 raman.gjf\n")
         f.write("cd ../\n")
+    profiling.count(files=1)
 
 def write_submit(append, molecule):
     if append == 1:
@@ -208,7 +135,296 @@ def write_submit(append, molecule):
             f.write("qsub sub_script.sh\n")
             f.write("cd ..\n")
 
-if __name__ == "__main__":
+def molecule_name(cfile):
+    """Return the molecule name of a coordinates file, e.g. coords/benzene.xyz -> benzene"""
+    return os.path.splitext(os.path.basename(cfile))[0]
+
+def list_coords(source):
+    """List the coordinate files of a batch
+
+    Args:
+        source (str): A directory of .xyz files, or a manifest file with one
+            coordinates file per line (relative paths are taken from the
+            manifest's directory, lines starting with # are skipped)
+
+    Returns:
+        cfiles (list): The coordinate files in a stable order
+
+    """
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, "*.xyz")))
+    cfiles = []
+    base = os.path.dirname(source)
+    with open(source,"r") as f:
+        for line in f:
+            line = line.strip()
+            if line and line[0] != "#":
+                cfiles.append(os.path.join(base, line))
+    return cfiles
+
+def size_job(model, steps, coords, nproc=28):
+    """Size a job from the cost model of sizing.py
+
+    Args:
+        model (dict): Cost model as returned by sizing.fit
+        steps (list): The names of the steps the job runs
+        coords (list): The coordinate lines of the molecule
+        nproc (int): The most cores the job may use [default: 28]
+
+    Returns:
+        resources (dict): nproc, mem, h_rt and mem_per_core
+
+    """
+    return sizing.suggest(model, steps, sizing.estimate_nbasis(coords), max_nproc=nproc)
+
+def step_resources(model, steps, coords, resources):
+    """Size every step of a job on its own, as run by an array job
+
+    Each step keeps the cores and memory of the job its input was written
+    for and gets the walltime predicted for that step alone.
+
+    Args:
+        model (dict): Cost model as returned by sizing.fit, or None for the
+            walltimes of the steps
+        steps (list): The workflow steps
+        coords (list): The coordinate lines of the molecule
+        resources (dict): The nproc and mem_per_core of the job
+
+    Returns:
+        resources (dict): nproc, h_rt and mem_per_core per step name
+
+    """
+    sized = {}
+    for step in steps:
+        h_rt = step["h_rt"]
+        if model is not None:
+            h_rt = size_job(model, [step["name"]], coords, nproc=resources["nproc"])["h_rt"]
+        sized[step["name"]] = {"nproc": resources["nproc"], "h_rt": h_rt, "mem_per_core": resources["mem_per_core"]}
+    return sized
+
+def batch_resources(sized):
+    """Combine the step resources of many molecules into ones that fit them all
+
+    Args:
+        sized (list): step_resources of every molecule
+
+    Returns:
+        resources (dict): The most cores, walltime and memory per core any
+            molecule needs, per step name
+
+    """
+    combined = {}
+    for resources in sized:
+        for name, r in resources.items():
+            if name not in combined:
+                combined[name] = dict(r)
+                continue
+            c = combined[name]
+            c["nproc"] = max(c["nproc"], r["nproc"])
+            c["h_rt"] = max(c["h_rt"], r["h_rt"], key=lambda h_rt: [int(v) for v in h_rt.split(":")])
+            c["mem_per_core"] = max(c["mem_per_core"], r["mem_per_core"], key=lambda mem: int(mem.rstrip("G")))
+    return combined
+
+def reuse_steps(store, path, inputs):
+    """Link finished identical calculations into a molecule's step directories
+
+    Args:
+        store (dict): Finished calculations keyed by fingerprint, see dedup.py
+        path (str): The molecule directory
+        inputs (list): (step directory, input file) pairs in run order
+
+    Returns:
+        reused (list): The step directories whose outputs were linked in
+
+    """
+    reused = []
+    for step, gjf in inputs:
+        if dedup.reuse(store, os.path.join(path, step, gjf)):
+            reused.append(step)
+    return reused
+
+@profiling.profiled
+def gen_tree(coords, path=".", irraman=0, nstates=6, model=None, store=None, runner=0, name=None, **kwargs):
+    """Generate every input and the job script of one molecule's workflow
+
+    Args:
+        coords (list): The coordinate lines of the molecule
+        path (str): The molecule directory [default: .]
+        irraman (int): Generate the IR/Raman workflow instead of absorption/emission [default: 0]
+        nstates (int): Number of excited states to calculate [default: 6]
+        model (dict): Cost model used to size nproc, mem and walltime [default: None]
+        store (dict): Finished calculations to reuse instead of recomputing,
+            keyed by fingerprint, see dedup.py [default: None]
+        runner (int): Write a runner script that starts independent steps at
+            the same time on disjoint cores, see workflow.gen_runner_script [default: 0]
+        name (str): The job name of the runner script [default: None]
+        kwargs: functional, basis, dispersion, solv_model, solvent, charge,
+            multiplicity, nproc and mem, as for workflow.gen_step
+
+    Returns:
+        reused (list): The step directories whose outputs were reused
+        steps (list): The workflow steps of the molecule
+        sized (dict): The resources of every step run on its own, see
+            step_resources
+
+    """
+    steps = workflow.SPECTRA if irraman == 1 else workflow.ABSORPTION
+    resources = {"h_rt": "12:00:00", "mem_per_core": "4G"}
+    if model is not None:
+        resources = size_job(model, [step["name"] for step in steps], coords, nproc=kwargs.get("nproc", 28))
+        kwargs["nproc"] = resources["nproc"]
+        kwargs["mem"] = resources["mem"]
+    nproc = kwargs.get("nproc", 28)
+    sized = step_resources(model, steps, coords, {"nproc": nproc, "mem_per_core": resources["mem_per_core"]})
+    cores = workflow.assign_cores(steps, nproc) if runner == 1 else {}
+    os.makedirs(path, exist_ok=True)
+    for step in steps:
+        cpu = cores[step["name"]][0] if runner == 1 else None
+        workflow.gen_step(step, coords=coords, path=path, nstates=nstates, cpu=cpu, **kwargs)
+    reused = []
+    if store is not None:
+        reused = reuse_steps(store, path, [(step["dir"], step["input"]) for step in steps])
+    solvent = kwargs.get("solvent", "Methanol")
+    functional = kwargs.get("functional", "B3LYP")
+    if runner == 1:
+        workflow.gen_runner_script(steps, cores, os.path.join(path, "sub_script.sh"), name=name or "%s-%s" % (solvent[:4], functional),
+                                   nproc=nproc, h_rt=resources["h_rt"], mem_per_core=resources["mem_per_core"], skip=reused)
+    elif irraman == 1:
+        gen_spec_script(solvent, path, nproc=nproc, functional=functional,
+                        h_rt=resources["h_rt"], mem_per_core=resources["mem_per_core"], skip=reused)
+    else:
+        gen_sub_script(solvent, nproc=nproc, functional=functional, path=path,
+                       h_rt=resources["h_rt"], mem_per_core=resources["mem_per_core"], skip=reused)
+    return reused, steps, sized
+
+def gen_molecule(cfile, outdir=".", **kwargs):
+    """Generate the full input tree of one molecule of a batch
+
+    Args:
+        cfile (str): The .xyz coordinates file of the molecule
+        outdir (str): Directory the molecule directory is created in [default: .]
+        kwargs: Passed on to gen_tree
+
+    Returns:
+        molecule (str): The name of the molecule directory, or None if every
+            step was reused and there is nothing left to run
+        sized (dict): The resources of every step, see step_resources
+
+    """
+    return gen_frame((molecule_name(cfile), read_xyz(cfile)), outdir=outdir, **kwargs)
+
+def gen_frame(job, outdir=".", **kwargs):
+    """Generate the full input tree of one molecule from its coordinate lines
+
+    Args:
+        job (tuple): (molecule, coords), the name of the molecule directory
+            and its coordinate lines
+        outdir (str): Directory the molecule directory is created in [default: .]
+        kwargs: Passed on to gen_tree
+
+    Returns:
+        molecule (str): The name of the molecule directory, or None if every
+            step was reused and there is nothing left to run
+        sized (dict): The resources of every step, see step_resources
+
+    """
+    molecule, coords = job
+    reused, steps, sized = gen_tree(coords, path=os.path.join(outdir, molecule), **kwargs)
+    if len(reused) == len(steps):
+        return None, sized
+    return molecule, sized
+
+def gen_batch(cfiles, outdir=".", irraman=0, workers=None, array=0, **kwargs):
+    """Generate the input trees of many molecules in a process pool
+
+    Every molecule gets its own directory under outdir, and a single
+    submit.sh covering all of them is written once every tree is done. With
+    array=1 one SGE array job per workflow step is written instead (see
+    submit.gen_array_jobs), submitted by submit_arrays.sh.
+
+    Args:
+        cfiles (list): The .xyz coordinates files, one per molecule
+        outdir (str): Directory the molecule directories are created in [default: .]
+        irraman (int): Generate the IR/Raman trees instead of absorption/emission [default: 0]
+        workers (int): Number of worker processes [default: os.cpu_count()]
+        array (int): Write SGE array jobs instead of submit.sh [default: 0]
+        kwargs: Passed on to gen_tree
+
+    Returns:
+        molecules (list): The molecule directory names with work left to
+            run, in the order of cfiles
+
+    """
+    from multiprocessing import Pool
+    os.makedirs(outdir, exist_ok=True)
+    work = partial(gen_molecule, outdir=outdir, irraman=irraman, **kwargs)
+    with Pool(workers) as pool:
+        results = pool.map(work, cfiles, chunksize=max(1, len(cfiles)//(8*(workers or os.cpu_count() or 1))))
+    results = [(molecule, sized) for molecule, sized in results if molecule is not None]
+    return write_batch_submit([molecule for molecule, sized in results], outdir=outdir, irraman=irraman, array=array,
+                              nproc=kwargs.get("nproc", 28), resources=batch_resources([sized for molecule, sized in results]))
+
+def gen_conformers(xyzfile, outdir=".", irraman=0, workers=None, array=0, stride=1, **kwargs):
+    """Generate an input tree for every frame of a multi-frame .xyz file
+
+    The frames of a conformer ensemble or trajectory are streamed from the
+    file, so it is never loaded whole. Frame i goes to the molecule directory
+    <name>_<i>, numbered from 0 in the file.
+
+    Args:
+        xyzfile (str): The multi-frame .xyz file
+        outdir (str): Directory the molecule directories are created in [default: .]
+        irraman (int): Generate the IR/Raman trees instead of absorption/emission [default: 0]
+        workers (int): Number of worker processes [default: os.cpu_count()]
+        array (int): Write SGE array jobs instead of submit.sh [default: 0]
+        stride (int): Use every stride-th frame [default: 1]
+        kwargs: Passed on to gen_tree
+
+    Returns:
+        molecules (list): The molecule directory names with work left to run
+
+    """
+    import geometry
+    from multiprocessing import Pool
+    os.makedirs(outdir, exist_ok=True)
+    name = molecule_name(xyzfile)
+    frames = itertools.islice(geometry.iter_xyz(xyzfile), 0, None, stride)
+    jobs = (("%s_%05d" % (name, i*stride), geometry.to_lines(frame)) for i, frame in enumerate(frames))
+    work = partial(gen_frame, outdir=outdir, irraman=irraman, **kwargs)
+    with Pool(workers) as pool:
+        results = [(molecule, sized) for molecule, sized in pool.imap(work, jobs, chunksize=64) if molecule is not None]
+    return write_batch_submit([molecule for molecule, sized in results], outdir=outdir, irraman=irraman, array=array,
+                              nproc=kwargs.get("nproc", 28), resources=batch_resources([sized for molecule, sized in results]))
+
+def write_batch_submit(molecules, outdir=".", irraman=0, array=0, nproc=28, resources=None):
+    """Write the submission of a generated batch, see gen_batch
+
+    Args:
+        molecules (list): The molecule directory names with work left to run
+        outdir (str): Directory holding the molecule directories [default: .]
+        irraman (int): The batch is the IR/Raman workflow [default: 0]
+        array (int): Write SGE array jobs instead of submit.sh [default: 0]
+        nproc (int): Number of processors of each array task [default: 28]
+        resources (dict): nproc, h_rt and mem_per_core of the array task of
+            each step, see batch_resources [default: None]
+
+    Returns:
+        molecules (list): The molecule directory names passed in
+
+    """
+    if array == 1:
+        steps = workflow.SPECTRA if irraman == 1 else workflow.ABSORPTION
+        submit.gen_array_jobs(molecules, steps, outdir=outdir, campaign=os.path.basename(os.path.abspath(outdir)), nproc=nproc,
+                              resources=resources)
+        return molecules
+    with open(os.path.join(outdir, "submit.sh"),"w") as f:
+        for molecule in molecules:
+            f.write("cd %s\n" % molecule)
+            f.write("qsub sub_script.sh\n")
+            f.write("cd ..\n")
+    return molecules
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Generate gaussian input files for absorption/emission calculations')
     parser.add_argument('-cfile', type=str, default=None, help='Coordinates file to use')
     parser.add_argument('-basis', type=str, default="6-31(d,p)", help='Basis set to use [default: 6-31(d,p)]')
@@ -223,31 +439,51 @@ if __name__ == "__main__":
     parser.add_argument('-solv_model', type=str, default="PCM", help='Solvent model to use [default: PCM]')
     parser.add_argument('-irraman', type=int, default=0, help='Calculate IR/Raman? [0] No [1] Yes')
     parser.add_argument('-append', type=int, default=1, help='Append to existing files? [0] No [1] Yes')
-    args = parser.parse_args()
+    parser.add_argument('-cdir', type=str, default=None, help='Directory of .xyz files or manifest listing them, for batch generation')
+    parser.add_argument('-outdir', type=str, default=".", help='Directory to write the batch molecule directories to [default: .]')
+    parser.add_argument('-workers', type=int, default=None, help='Number of worker processes for batch generation [default: all cores]')
+    parser.add_argument('-array', type=int, default=0, help='Write SGE array jobs per step for a batch? [0] No [1] Yes')
+    parser.add_argument('-history', type=str, default=None, help='Run history of sizing.py used to size nproc, mem and walltime, with -nproc as the upper limit')
+    parser.add_argument('-store', type=str, default=None, help='Store of finished calculations from dedup.py to reuse')
+    parser.add_argument('-conformers', type=str, default=None, help='Multi-frame .xyz file (conformers, trajectory) to generate one molecule per frame from')
+    parser.add_argument('-stride', type=int, default=1, help='Use every stride-th frame of -conformers [default: 1]')
+    parser.add_argument('-runner', type=int, default=0, help='Run independent steps side by side on split cores? [0] No [1] Yes')
+    args = parser.parse_args(argv)
 
-    if args.cfile == None:
-        raise ValueError("Please provide a coordinates file")
+    model = None
+    if args.history is not None:
+        model = sizing.fit(sizing.load_history(args.history))
 
-    
-    if args.irraman == 0:
+    if args.conformers is not None:
+        molecules = gen_conformers(args.conformers, outdir=args.outdir, irraman=args.irraman, nstates=args.nstates, workers=args.workers, array=args.array,
+                                   stride=args.stride, model=model, runner=args.runner, store=None if args.store is None else dedup.load_store(args.store),
+                                   functional=args.functional, basis=args.basis, dispersion=args.dispersion, solv_model=args.solv_model, solvent=args.solvent,
+                                   charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem)
+        print('Generated %d conformers with work to run in %s' % (len(molecules), args.outdir))
+    elif args.cdir is not None:
+        cfiles = list_coords(args.cdir)
+        molecules = gen_batch(cfiles, outdir=args.outdir, irraman=args.irraman, nstates=args.nstates, workers=args.workers, array=args.array, model=model, runner=args.runner,
+                              store=None if args.store is None else dedup.load_store(args.store),
+                              functional=args.functional, basis=args.basis, dispersion=args.dispersion, solv_model=args.solv_model, solvent=args.solvent,
+                              charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem)
+        print('Generated %d molecules with work to run in %s' % (len(molecules), args.outdir))
+    elif args.cfile == None:
+        raise ValueError("Please provide a coordinates file")
+    elif args.irraman == 0:
         coords = read_coords(args.cfile)
-        gen_gs_geom_opt(coords, functional=args.functional, basis=args.basis, dispersion=args.dispersion, solv_model=args.solv_model, solvent=args.solvent,
-        charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem) # step 1
-        gen_vert_exc(nstates=6, functional=args.functional, basis=args.basis, dispersion=args.dispersion, solv_model=args.solv_model, solvent=args.solvent,
-        charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem) # step 3
-        gen_exc_geom(nstates=6, functional=args.functional, basis=args.basis, dispersion=args.dispersion, solv_model=args.solv_model, solvent=args.solvent,
-        charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem) # step 4
-        gen_exc_solv(nstates=6, functional=args.functional, basis=args.basis, dispersion=args.dispersion, solv_model=args.solv_model, solvent=args.solvent,
-        charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem) # step 5
-        gen_gs_sp(functional=args.functional, basis=args.basis, dispersion=args.dispersion, solv_model=args.solv_model, solvent=args.solvent,
-        charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem) # step 6
-        gen_sub_script(args.solvent, nproc=args.nproc, functional=args.functional)
+        gen_tree(coords, path=".", irraman=0, nstates=args.nstates, model=model, runner=args.runner,
+                 store=None if args.store is None else dedup.load_store(args.store),
+                 functional=args.functional, basis=args.basis, dispersion=args.dispersion, solv_model=args.solv_model, solvent=args.solvent,
+                 charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem)
     elif args.irraman == 1:
-        print('Working on molecule %s' % args.cfile.strip('xyz'))
-        write_submit(args.append, args.cfile.strip('.xyz').replace("coords/",""))
+        molecule = molecule_name(args.cfile)
+        print('Working on molecule %s' % molecule)
+        write_submit(args.append, molecule)
         coords = read_xyz(args.cfile)
-        gen_ir(coords, args.cfile.strip('.xyz').replace("coords/",""), functional=args.functional, basis=args.basis, dispersion=args.dispersion, solv_model=args.solv_model, solvent=args.solvent,
-               charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem)
-        gen_raman(coords, args.cfile.strip('.xyz').replace("coords/",""), functional=args.functional, basis=args.basis, dispersion=args.dispersion, solv_model=args.solv_model, solvent=args.solvent,
-                  charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem) 
-        gen_spec_script(args.solvent, args.cfile.strip('.xyz').replace("coords/",""), nproc=args.nproc, functional=args.functional)       
\ No newline at end of file
+        gen_tree(coords, path=molecule, irraman=1, model=model, runner=args.runner, name="ir-%s" % molecule,
+                 store=None if args.store is None else dedup.load_store(args.store),
+                 functional=args.functional, basis=args.basis, dispersion=args.dispersion, solv_model=args.solv_model, solvent=args.solvent,
+                 charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem)
+
+if __name__ == "__main__":
+    main()
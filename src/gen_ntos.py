@@ -1,84 +1,243 @@
 #!/usr/bin/env python
-import numpy as np
-import os, sys
-
-def gen_header(nproc, oldchk, chk, mem):
-    """Generate gaussian input file header"""
-    line1="%%NProcShared=%d" % nproc
-    if oldchk is not None:
-        line2="%%oldchk=%s" % oldchk
-    line3="%%chk=%s" % chk
-    line4="%%mem=%dGB" % mem
-    header = []
-    if oldchk is not None:
-        header = [line1, line2, line3, line4]
-    else:
-        header = [line1, line3, line4]
-
-    return header
+import csv
+import mmap
+import os
+import re
+import gauss_log
+import profiling
+import submit
+import workflow
 
-def grab_trans(state=1):
-    flag = 0
+def grab_trans(state=1, logfile="vert_exc/vert_exc.log"):
     trans = []
-    with open('vert_exc/vert_exc.log','r') as f:
-        lines = f.readlines()
-        for line in lines:
-            if "Excited State" in line:
-                vals = line.strip().split()
-                if state == int(vals[2][0]):
-                    flag=1
-                else:
-                    flag=0
-            if flag == 1 and "->" in line:
-                trans.append(line)
+    for exc in gauss_log.scan_log(logfile)["states"]:
+        if exc["state"] == state:
+            trans += [t for t in exc["trans"] if t[1] != "<-"]
     return trans
             
             
 
 
 
+# The NTO occupations are printed as the occupied orbital eigenvalues of
+# each link; a link ends with its termination line.
+_NTO = re.compile(rb"^ (?:Alpha  occ\. eigenvalues --(?P<occ>.*)|(?P<end>Normal termination|Error termination))", re.MULTILINE)
+_NUMBER = re.compile(rb"-?\d+\.\d+")
+_TRANSITION = re.compile(r"Transition=(\d+)", re.IGNORECASE)
+
+def parse_states(text):
+    """Parse a list of states such as 1,3-5 into [1, 3, 4, 5]"""
+    states = []
+    for part in text.split(","):
+        first, _, last = part.strip().partition("-")
+        states += list(range(int(first), int(last or first) + 1))
+    return states
+
+def select_states(states=None, min_f=0.0, logfile="vert_exc/vert_exc.log"):
+    """Choose the excited states to compute the NTOs of
+
+    The states are taken from the last block of excited states in the log,
+    matched by their full state number.
+
+    Args:
+        states (list): State numbers to keep, None for all [default: None]
+        min_f (float): Smallest oscillator strength to keep [default: 0]
+        logfile (str): The log file to read [default: vert_exc/vert_exc.log]
+
+    Returns:
+        states (list): The selected state numbers present in the log
+
+    """
+    found = gauss_log.last_states(gauss_log.scan_log(logfile))
+    return [exc["state"] for exc in found if (states is None or exc["state"] in states) and exc["f"] >= min_f]
+
+def gen_batch_ntos(states, functional="B3LYP", basis="6-31(d,p)", dispersion=1, solvent="Methanol",
+                   charge=0, multiplicity=1, nproc=28, mem=100, mem_per_core="4G"):
+    """This generates the ntos calculations of several states as one multi-link job
+
+    Every state is one --Link1-- link of ntos/ntos.gjf and saves its NTOs
+    to ntos/state_N.chk. All links run in a single job, ntos/sub_ntos.sh,
+    which queues once instead of once per state.
+
+    Args:
+        states (list): The excited states to compute the NTOs of
+        The remaining arguments are as for gen_all_ntos
+
+    Returns:
+        filename (str): The input file written
+
+    """
+    links = workflow.nto_batch_step(states)
+    filename = workflow.gen_links(links, functional=functional, basis=basis, dispersion=dispersion, solvent=solvent,
+                                  charge=charge, multiplicity=multiplicity, nproc=nproc, mem=mem)
+    hours = sum(int(link["h_rt"].split(":")[0]) for link in links)
+    with open("ntos/sub_ntos.sh","w") as f:
+        f.write("#!/bin/bash\n")
+        f.write("#\n")
+        f.write("#$ -N %s-ntos\n" % (solvent[:4]))
+        f.write("#$ -j y\n")
+        f.write("#$ -l h_rt=%02d:00:00\n" % hours)
+        f.write("#$ -pe mpi_28_tasks_per_node %d\n" % nproc)
+        f.write("#$ -l mem_per_core=%s\n" % mem_per_core)
+        f.write("#$ -V\n")
+
+        f.write("module load gaussian/16.C.01\n")
+        f.write("g16 ntos.gjf\n")
+    return filename
+
+def grab_nto_occupations(logfile):
+    """This grabs the NTO occupations of every link of an NTO log
+
+    Args:
+        logfile (str): The log of a single state or of a batched NTO job
+
+    Returns:
+        occupations (list): Per link, the occupations sorted from the
+            largest down
+
+    """
+    occupations = []
+    current = []
+    if os.path.getsize(logfile) == 0:
+        return occupations
+    with open(logfile, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for match in _NTO.finditer(mm):
+                if match.group("end") is not None:
+                    occupations.append(sorted(current, reverse=True))
+                    current = []
+                else:
+                    current += [float(v) for v in _NUMBER.findall(match.group("occ"))]
+    if current:
+        occupations.append(sorted(current, reverse=True))
+    return occupations
+
+def nto_table(path="."):
+    """Collect the NTO occupations of a molecule directory into one table
+
+    The batched job ntos/ntos.gjf is read when it exists, with the state of
+    each link taken from its route; otherwise the per state jobs
+    ntos/N/state_N.log are read. Without ntos/ there are no rows.
+
+    Args:
+        path (str): The molecule directory [default: .]
+
+    Returns:
+        rows (list): One dict per state with state, ev, nm, f (from
+            vert_exc.log, NaN if missing) and occupations
+
+    """
+    jobs = []
+    batch = os.path.join(path, "ntos", "ntos.gjf")
+    if os.path.isfile(batch):
+        with open(batch, "r") as f:
+            states = [int(s) for s in _TRANSITION.findall(f.read())]
+        log = os.path.join(path, "ntos", "ntos.log")
+        occupations = grab_nto_occupations(log) if os.path.isfile(log) else []
+        jobs = [(state, occupations[i] if i < len(occupations) else []) for i, state in enumerate(states)]
+    elif os.path.isdir(os.path.join(path, "ntos")):
+        for directory in sorted(os.listdir(os.path.join(path, "ntos")), key=lambda d: int(d) if d.isdigit() else -1):
+            log = os.path.join(path, "ntos", directory, "state_%s.log" % directory)
+            if directory.isdigit() and os.path.isfile(log):
+                occupations = grab_nto_occupations(log)
+                jobs.append((int(directory), occupations[0] if occupations else []))
+    vert_exc = os.path.join(path, "vert_exc", "vert_exc.log")
+    found = {}
+    if os.path.isfile(vert_exc):
+        found = dict((exc["state"], exc) for exc in gauss_log.last_states(gauss_log.scan_log(vert_exc)))
+    rows = []
+    for state, occupations in jobs:
+        exc = found.get(state, {"ev": float("nan"), "nm": float("nan"), "f": float("nan")})
+        rows.append({"state": state, "ev": exc["ev"], "nm": exc["nm"], "f": exc["f"], "occupations": occupations})
+    return rows
+
+def write_nto_table(rows, filename="nto_occupations.csv", top=5):
+    """Write the NTO table of nto_table to a CSV file
+
+    Args:
+        rows (list): Rows as returned by nto_table
+        filename (str): The CSV file [default: nto_occupations.csv]
+        top (int): Number of largest occupations written per state [default: 5]
+
+    """
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["state", "ev", "nm", "f"] + ["occ_%d" % (i+1) for i in range(top)])
+        for row in rows:
+            occ = row["occupations"][:top]
+            writer.writerow([row["state"], "%.4f" % row["ev"], "%.2f" % row["nm"], "%.4f" % row["f"]]
+                            + ["%.5f" % o for o in occ] + [""] * (top - len(occ)))
+
 def gen_all_ntos(functional="B3LYP", basis="6-31(d,p)", dispersion=1,
-                    solvent="Methanol", charge=0, multiplicity=1, nproc=28, mem=100):
-    """This generates a set of ntos calculations for each transition"""
-
-    num_trans = 0
-    trans = grab_trans(state=1)
-    for i in range(len(trans)):    
-        header = gen_header(nproc, "../../vert_exc/vert_exc.chk", "state_%d.chk"%(i+1), mem)
-        os.makedirs("ntos/%d"%(i+1),exist_ok=True)
-        gen_sub_script(solvent=solvent, nproc=nproc, state=i+1)
-        with open("ntos/%d/state_%d.gjf"%(i+1,i+1),"w") as f:
-            for line in header:
-                f.write(line+"\n")
-            if dispersion == 1:
-                f.write("#n %s/%s empiricaldispersion=gd3 Geom=AllCheck Guess=(Read,Only) Density=(Check,Transition=%d) Pop=(Minimal,NTO,SaveNTO) SCRF=(Solvent=%s)\n" % (functional, basis,i+1, solvent))
-            else:
-                f.write("#n %s/%s Geom=AllCheck Guess=(Read,Only) Density=(Check,Transition=%d) Pop=(Minimal,NTO,SaveNTO) SCRF=(Solvent=%s)\n" % (functional, basis, i+1, solvent))
-            f.write("\n")
-            f.write("Calculation of the Natural Transition Orbitals\n")
-            f.write("\n")
-            f.write("%d %d\n" % (charge, multiplicity))
-            f.write("\n")
-    gen_automate(len(trans))
-
-def gen_sub_script(solvent,nproc=28,state=1):
+                    solvent="Methanol", charge=0, multiplicity=1, nproc=28, mem=100, array=0, runner=0,
+                    batch=0, states=None, min_f=0.0):
+    """This generates a set of ntos calculations for each excited state
+
+    The states are chosen by states and min_f, see select_states. With
+    array=1 the calculations are submitted as a single SGE array job
+    (sub_ntos_array.sh) instead of one qsub per state. With runner=1 they
+    all run side by side on disjoint cores of one allocation
+    (sub_ntos_runner.sh). With batch=1 they are computed as the links of a
+    single job instead, see gen_batch_ntos.
+    """
+
+    selected = select_states(states=states, min_f=min_f)
+    if not selected:
+        print("No excited state of vert_exc/vert_exc.log matches the selection, no NTO calculations written")
+        return
+    if batch == 1:
+        gen_batch_ntos(selected, functional=functional, basis=basis, dispersion=dispersion,
+                       solvent=solvent, charge=charge, multiplicity=multiplicity, nproc=nproc, mem=mem)
+        return
+
+    steps = [workflow.nto_step(state) for state in selected]
+    cores = workflow.assign_cores(steps, nproc) if runner == 1 else {}
+    for step in steps:
+        cpu = cores[step["name"]][0] if runner == 1 else None
+        workflow.gen_step(step, functional=functional, basis=basis, dispersion=dispersion, solvent=solvent,
+                          charge=charge, multiplicity=multiplicity, nproc=nproc, mem=mem, cpu=cpu)
+        if array == 0 and runner == 0:
+            gen_sub_script(solvent=solvent, nproc=nproc, state=step["state"])
+    if runner == 1:
+        workflow.gen_runner_script(steps, cores, "sub_ntos_runner.sh", name="%s-nto" % solvent[:4], nproc=nproc)
+    elif array == 1:
+        gen_array(selected, solvent=solvent, nproc=nproc)
+    else:
+        gen_automate(selected)
+
+@profiling.profiled
+def gen_sub_script(solvent,nproc=28,state=1,h_rt="12:00:00",mem_per_core="4G"):
     with open("ntos/%d/sub_ntos.sh"%state,"w") as f:
         f.write("#!/bin/bash\n")
         f.write("#\n")
         f.write("#$ -N %s-nto%s\n" % (solvent[:4],state))
         f.write("#$ -j y\n")
-        f.write("#$ -l h_rt=12:00:00\n")
+        f.write("#$ -l h_rt=%s\n" % h_rt)
         f.write("#$ -pe mpi_28_tasks_per_node %d\n" % nproc)
-        f.write("#$ -l mem_per_core=4G\n")
+        f.write("#$ -l mem_per_core=%s\n" % mem_per_core)
         f.write("#$ -V\n")
 
         f.write("module load gaussian/16.C.01\n")
         f.write("g16 state_%d.gjf\n"%state) 
+    profiling.count(files=1)
 
-def gen_automate(ns):
+def gen_array(states, solvent="Methanol", nproc=28):
+    """Write one SGE array job running the ntos calculation of every state
+
+    Task i runs the state on line i of ntos/states.txt.
+    """
+    with open("ntos/states.txt","w") as f:
+        for state in states:
+            f.write("%d\n" % state)
+    commands = ['STATE=$(sed -n "${SGE_TASK_ID}p" ntos/states.txt)',
+                'cd ntos/$STATE',
+                '${G16:-g16} state_$STATE.gjf']
+    submit.write_array_script("sub_ntos_array.sh", "%s-nto" % solvent[:4], len(states), commands, nproc=nproc)
+
+def gen_automate(states):
     with open("automate_nto.sh","w") as f:
         f.write("#!/bin/bash\n")
-        f.write("for i in {1..%d}; do\n"%ns)
+        f.write("for i in %s; do\n" % " ".join(str(state) for state in states))
         f.write("    cd ntos/$i\n")
         f.write("    qsub sub_ntos.sh\n")
         f.write("    cd ../..\n")
@@ -86,7 +245,7 @@ def gen_automate(ns):
 
 
 
-if __name__ == "__main__":
+def main(argv=None):
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('-basis', type=str, default="6-31(d,p)", help='Basis set to use [default: 6-31(d,p)]')
@@ -97,7 +256,23 @@ if __name__ == "__main__":
     parser.add_argument('-nproc', type=int, default=28, help='Number of processors to use [default: 28]')
     parser.add_argument('-mem', type=int, default=100, help='Memory to use in GB [default: 100]')
     parser.add_argument('-solvent', type=str, default="Methanol", help='Solvent to use [default: Methanol]')
-    args = parser.parse_args()
+    parser.add_argument('-array', type=int, default=0, help='Submit as one SGE array job? [0] No [1] Yes')
+    parser.add_argument('-runner', type=int, default=0, help='Run all states side by side in one allocation? [0] No [1] Yes')
+    parser.add_argument('-batch', type=int, default=0, help='Run the states as the links of one job? [0] No [1] Yes')
+    parser.add_argument('-states', type=str, default=None, help='States to compute the NTOs of, e.g. 1,3-5 [default: all states of vert_exc.log]')
+    parser.add_argument('-min_f', type=float, default=0.0, help='Smallest oscillator strength of a state to compute the NTOs of [default: 0]')
+    parser.add_argument('-collect', type=str, default=None, help='Write the NTO occupations of finished jobs to this CSV file instead of generating inputs')
+    args = parser.parse_args(argv)
 
+    if args.collect is not None:
+        rows = nto_table()
+        if not rows:
+            print("No NTO calculations found in ntos/")
+        write_nto_table(rows, filename=args.collect)
+        return
     gen_all_ntos(functional=args.functional, basis=args.basis, dispersion=args.dispersion,
-                    solvent=args.solvent, charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem)
+                    solvent=args.solvent, charge=args.charge, multiplicity=args.multiplicity, nproc=args.nproc, mem=args.mem, array=args.array, runner=args.runner,
+                    batch=args.batch, states=None if args.states is None else parse_states(args.states), min_f=args.min_f)
+
+if __name__ == "__main__":
+    main()
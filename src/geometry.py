@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+import argparse
+import itertools
+import mmap
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+
+# A molecular geometry: atomic numbers as an (n,) int array, cartesian
+# coordinates in Angstrom as an (n, 3) float64 array and a free text comment,
+# e.g. the comment line of an XYZ frame.
+Geometry = namedtuple("Geometry", ["numbers", "coords", "comment"])
+
+SYMBOLS = ["X",
+           "H", "He",
+           "Li", "Be", "B", "C", "N", "O", "F", "Ne",
+           "Na", "Mg", "Al", "Si", "P", "S", "Cl", "Ar",
+           "K", "Ca", "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn", "Ga", "Ge", "As", "Se", "Br", "Kr",
+           "Rb", "Sr", "Y", "Zr", "Nb", "Mo", "Tc", "Ru", "Rh", "Pd", "Ag", "Cd", "In", "Sn", "Sb", "Te", "I", "Xe",
+           "Cs", "Ba", "La", "Ce", "Pr", "Nd", "Pm", "Sm", "Eu", "Gd", "Tb", "Dy", "Ho", "Er", "Tm", "Yb", "Lu",
+           "Hf", "Ta", "W", "Re", "Os", "Ir", "Pt", "Au", "Hg", "Tl", "Pb", "Bi", "Po", "At", "Rn"]
+
+_NUMBERS = dict((symbol.upper(), number) for number, symbol in enumerate(SYMBOLS))
+
+# The table gaussian prints for every geometry of a job. Symmetric molecules
+# get a Standard orientation table after each Input orientation table; with
+# NoSymm only the Input orientation is printed. A table only counts once its
+# closing line of dashes has been written.
+_ORIENTATION = re.compile(rb"(?P<kind>Standard|Input) orientation:[^\n]*\n(?:[^\n]*\n){4}"
+                          rb"(?P<rows>(?:[ \t]+\d+[ \t]+\d+[ \t]+-?\d+(?:[ \t]+\S+){3}[ \t]*\n)+)(?=[ \t]*-{5})")
+
+def atomic_number(element):
+    """Return the atomic number of an element symbol, or of a number given as text"""
+    if element.isdigit():
+        return int(element)
+    number = _NUMBERS.get(element.upper())
+    if number is None:
+        raise ValueError("Unknown element %s" % element)
+    return number
+
+def make_geometry(elements, coords, comment=""):
+    """Build a Geometry from element symbols or numbers and coordinates"""
+    numbers = np.array([atomic_number(str(e)) for e in elements], dtype=int)
+    coords = np.asarray(coords, dtype=np.float64).reshape(len(numbers), 3)
+    return Geometry(numbers, coords, comment)
+
+def _parse_atoms(lines, filename, linenos):
+    """Parse "element x y z" lines, reporting the line number of a bad line"""
+    elements, coords = [], []
+    for lineno, line in zip(linenos, lines):
+        vals = line.split()
+        if len(vals) < 4:
+            raise ValueError("%s:%d: expected 'element x y z', got %r" % (filename, lineno, line.rstrip("\n")))
+        try:
+            elements.append(atomic_number(vals[0]))
+            coords.append([float(v) for v in vals[1:4]])
+        except ValueError:
+            raise ValueError("%s:%d: expected 'element x y z', got %r" % (filename, lineno, line.rstrip("\n")))
+    return np.array(elements, dtype=int), np.array(coords, dtype=np.float64).reshape(-1, 3)
+
+def iter_xyz(filename):
+    """Stream the frames of a (multi-frame) XYZ file
+
+    Only one frame is held in memory at a time, so trajectories and
+    conformer ensembles of any length can be processed.
+
+    Args:
+        filename (str): The XYZ file
+
+    Yields:
+        geometry (Geometry): One frame, with the comment line as comment
+
+    """
+    with open(filename, "r") as f:
+        lineno = 0
+        for line in f:
+            lineno += 1
+            if not line.strip():
+                continue
+            try:
+                natoms = int(line)
+            except ValueError:
+                raise ValueError("%s:%d: expected the number of atoms, got %r" % (filename, lineno, line.rstrip("\n")))
+            comment = f.readline().strip()
+            lines = list(itertools.islice(f, natoms))
+            if len(lines) < natoms:
+                raise ValueError("%s:%d: frame has %d of %d atoms" % (filename, lineno, len(lines), natoms))
+            numbers, coords = _parse_atoms(lines, filename, itertools.count(lineno + 2))
+            lineno += 1 + natoms
+            yield Geometry(numbers, coords, comment)
+
+def read_coords(filename):
+    """Read a plain coordinates file of "element x y z" lines
+
+    Blank lines and lines starting with # or ! are skipped; any other line
+    that is not an atom is an error.
+
+    Args:
+        filename (str): The coordinates file
+
+    Returns:
+        geometry (Geometry): The geometry in the file
+
+    """
+    with open(filename, "r") as f:
+        atoms = [(i+1, line) for i, line in enumerate(f) if line.strip() and line.lstrip()[0] not in "#!"]
+    numbers, coords = _parse_atoms([line for i, line in atoms], filename, [i for i, line in atoms])
+    return Geometry(numbers, coords, "")
+
+def to_lines(geometry):
+    """Format a geometry as the coordinate lines of a gaussian input"""
+    return ["%-2s %15.8f %15.8f %15.8f" % (SYMBOLS[n], x, y, z) for n, (x, y, z) in zip(geometry.numbers, geometry.coords)]
+
+def write_xyz(f, geometry):
+    """Write a geometry as one XYZ frame to an open file"""
+    f.write("%d\n%s\n" % (len(geometry.numbers), geometry.comment))
+    for line in to_lines(geometry):
+        f.write(line + "\n")
+
+def _orientation(match, comment):
+    rows = np.array(match.group("rows").split(), dtype=np.float64).reshape(-1, 6)
+    return Geometry(rows[:,1].astype(int), rows[:,3:], comment)
+
+def log_geometries(logfile):
+    """Extract every geometry printed in a gaussian log in one pass
+
+    The log is memory mapped and each orientation table is converted to
+    arrays in one step. The Standard orientation tables are returned when
+    the log has any, else the Input orientation tables (NoSymm jobs).
+
+    Args:
+        logfile (str): The log file
+
+    Returns:
+        geometries (list): One Geometry per optimization step, in order, with
+            the kind of table and the step number as comment
+
+    """
+    found = {b"Standard": [], b"Input": []}
+    if os.path.getsize(logfile) > 0:
+        with open(logfile, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for match in _ORIENTATION.finditer(mm):
+                    kind = found[match.group("kind")]
+                    kind.append(_orientation(match, "%s orientation %d" % (match.group("kind").decode(), len(kind)+1)))
+    return found[b"Standard"] or found[b"Input"]
+
+def final_geometry(logfile):
+    """Return the last geometry printed in a gaussian log, or None
+
+    Only the end of the log is searched, so this is cheap even for long
+    optimizations.
+    """
+    if os.path.getsize(logfile) == 0:
+        return None
+    with open(logfile, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for kind in [b"Standard", b"Input"]:
+                start = mm.rfind(kind + b" orientation:")
+                while start != -1:
+                    match = _ORIENTATION.match(mm, start)
+                    if match is not None:
+                        return _orientation(match, "%s orientation final" % kind.decode())
+                    # A table cut off by a job that is still running; take the one before
+                    start = mm.rfind(kind + b" orientation:", 0, start)
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract the geometries of a gaussian log as XYZ')
+    parser.add_argument('-log', type=str, default="ground_state_geom_opt/geom_opt.log", help='Log file [default: ground_state_geom_opt/geom_opt.log]')
+    parser.add_argument('-out', type=str, default="final.xyz", help='Output XYZ file [default: final.xyz]')
+    parser.add_argument('-all', type=int, default=0, help='Write every optimization step instead of the final geometry? [0] No [1] Yes')
+    args = parser.parse_args(argv)
+
+    geometries = log_geometries(args.log) if args.all == 1 else [final_geometry(args.log)]
+    geometries = [g for g in geometries if g is not None]
+    if not geometries:
+        raise ValueError("No geometry found in %s" % args.log)
+    with open(args.out, "w") as f:
+        for geometry in geometries:
+            write_xyz(f, geometry)
+    print("Wrote %d geometries to %s" % (len(geometries), args.out))
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,55 @@
 #!/usr/bin/env python
 
+import mmap
+import os
+import re
 import numpy as np
 
+import profiling
+import spec_archive
+
+# A contiguous run of two-column numeric lines, e.g. "  13000.0000   0.123456D-02"
+_SPECTRUM_BLOCK = re.compile(rb"(?:^[ \t]*[-+]?[\d.]+(?:[DdEe][-+]?\d+)?[ \t]+[-+]?[\d.]+(?:[DdEe][-+]?\d+)?[ \t]*\r?\n)+", re.MULTILINE)
+
+@profiling.profiled
+def grab_all_spectra(logfile):
+    """This grabs every spectrum from the band_shape.log file
+
+    Each "Final Spectrum" section is located in the memory mapped log and the
+    block of frequency/intensity pairs that follows it is converted to NumPy
+    arrays in one step, Fortran D exponents included.
+
+    Args:
+        logfile (str): The name of the log file to grab the spectra from.
+
+    Returns:
+        spectra (list): One (freq, intensity) tuple of np.arrays per spectrum
+
+    """
+    spectra = []
+    if os.path.getsize(logfile) == 0:
+        return spectra
+    with open(logfile,'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = mm.find(b"Final Spectrum")
+            while start != -1:
+                block = _SPECTRUM_BLOCK.search(mm, start)
+                if block is None:
+                    break
+                data = block.group(0).replace(b"D", b"E").replace(b"d", b"e")
+                vals = np.array(data.split(), dtype=float).reshape(-1, 2)
+                spectra.append((vals[:,0], vals[:,1]))
+                profiling.count(matches=len(vals))
+                start = mm.find(b"Final Spectrum", block.end())
+            profiling.count(bytes=len(mm))
+    return spectra
+
 def grab_spectra(logfile):
     """This grabs the spectra from the band_shape.log file
 
     This function grabs the spectra from the band_shape.log file, which is the
-    output of a band shape calculation.
+    output of a band shape calculation. If the log holds more than one
+    spectrum they are concatenated; use grab_all_spectra to keep them apart.
 
     Args:
         logfile (str): The name of the log file to grab the spectra from.
@@ -16,37 +59,72 @@ def grab_spectra(logfile):
         intensity (np.array): The intensities of the spectra in a.u.
 
     """
-    freq = np.array([])
-    intensity = np.array([])
-    with open(logfile,'r') as f:
-        lines = f.readlines()
-        spect_flag=0
-        read_flag=0
-        start_read =0
-        for line in lines:
-            if len(line.strip().split()) == 2 and spect_flag == 1:
-                start_read = 1
-                vals = line.strip().split()
-                freq = np.append(freq,float(vals[0]))
-                intensity = np.append(intensity,float(vals[1].replace("D","E")))
-            if "----" in line and start_read == 1:
-                spect_flag = 0
-                start_read = 0
-            if "Final Spectrum" in line:
-                spect_flag = 1
-            
+    spectra = grab_all_spectra(logfile)
+    if not spectra:
+        return np.array([]), np.array([])
+    freq = np.concatenate([s[0] for s in spectra])
+    intensity = np.concatenate([s[1] for s in spectra])
     return freq, intensity
 
+def save_spectra(spectra, fmt="txt", prefix="spectra"):
+    """This writes spectra to disk
 
+    Args:
+        spectra (list): (freq, intensity) tuples as returned by grab_all_spectra
+        fmt (str): txt, npy or npz [default: txt]
+        prefix (str): Output file name without extension [default: spectra]
 
-if __name__ == "__main__":
+    Without spectra an empty file is written.
+    """
+    if fmt == "txt":
+        freq, intensity = np.array([]), np.array([])
+        if spectra:
+            freq = np.concatenate([s[0] for s in spectra])
+            intensity = np.concatenate([s[1] for s in spectra])
+        np.savetxt("%s.dat" % prefix,np.column_stack((freq,intensity)),fmt="%10.5f",header="Frequency (cm^-1) Intensity (a.u.)")
+    elif fmt == "npy":
+        np.save("%s.npy" % prefix, np.concatenate([np.column_stack(s) for s in spectra]) if spectra else np.empty((0, 2)))
+    elif fmt == "npz":
+        arrays = {}
+        for i, (freq, intensity) in enumerate(spectra):
+            arrays["freq_%d" % i] = freq
+            arrays["intensity_%d" % i] = intensity
+        np.savez("%s.npz" % prefix, **arrays)
+    else:
+        raise ValueError("Unknown spectrum format %s" % fmt)
+
+
+
+def main(argv=None):
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("-f", type=str, default="band_shape.log", help="The band shape to grab the spectra for.")
-    args = parser.parse_args()
-    freq, I = grab_spectra(args.f)
-    np.savetxt("spectra.dat",np.column_stack((freq,I)),fmt="%10.5f",header="Frequency (cm^-1) Intensity (a.u.)")
+    parser.add_argument("-binary", type=str, default=None, choices=["npy","npz"], help="Also write the spectra in binary format [default: None]")
+    parser.add_argument("-archive", type=str, default=None, help="Also append the spectra to this spectral archive [default: None]")
+    parser.add_argument("-name", type=str, default=None, help="Molecule name in the archive [default: the log's directory]")
+    parser.add_argument("-plot", type=int, default=None, help="Show the spectrum? [0] No [1] Yes [default: only with a display]")
+    args = parser.parse_args(argv)
+    spectra = grab_all_spectra(args.f)
+    if not spectra:
+        print("No Final Spectrum found in %s" % args.f)
+    if args.archive is not None and spectra:
+        name = args.name or os.path.basename(os.path.dirname(os.path.abspath(args.f)))
+        names = [name] if len(spectra) == 1 else ["%s/%d" % (name, i) for i in range(len(spectra))]
+        spec_archive.append(args.archive, names, [s[1] for s in spectra], freqs=[s[0] for s in spectra])
+    save_spectra(spectra, fmt="txt")
+    if args.binary is not None:
+        save_spectra(spectra, fmt=args.binary)
 
-    import matplotlib.pyplot as plt
-    plt.plot(1E7/freq,I)
-    plt.show()
\ No newline at end of file
+    # plt.show() blocks, or fails, on compute nodes, so only plot with a display
+    plot = args.plot
+    if plot is None:
+        plot = 1 if os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY") else 0
+    if plot == 1 and spectra:
+        freq = np.concatenate([s[0] for s in spectra])
+        I = np.concatenate([s[1] for s in spectra])
+        import matplotlib.pyplot as plt
+        plt.plot(1E7/freq,I)
+        plt.show()
+
+if __name__ == "__main__":
+    main()
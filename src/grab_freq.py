@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+import argparse
+import mmap
+import os
+import re
+from multiprocessing import Pool
+
+import numpy as np
+
+import broaden
+import harvest
+import profiling
+
+# Step logs of the IR/Raman workflow, relative to a molecule directory
+VIB_LOGS = {"infrared": "infrared/infrared.log", "raman": "raman/raman.log"}
+
+# The normal mode tables of a freq job. "Frequencies ---" (three dashes)
+# belongs to the high precision HPModes table and is skipped.
+_VIB = re.compile(rb"^ (?:(?P<header>Harmonic frequencies \(cm\*\*-1\))"
+                  rb"|Frequencies --(?!-)(?P<freq>.*)"
+                  rb"|IR Inten\s+--(?P<ir>.*)"
+                  rb"|Raman Activ --(?P<raman>.*))", re.MULTILINE)
+
+def _to_array(chunks):
+    """Convert the value columns of the matched lines to one array"""
+    if not chunks:
+        return np.array([])
+    return np.array(b" ".join(chunks).split(), dtype=float)
+
+@profiling.profiled
+def grab_freq(logfile):
+    """This grabs the normal modes from a freq or freq=Raman log file
+
+    The log is memory mapped and scanned once. When a log holds more than
+    one frequency calculation only the last one is returned.
+
+    Args:
+        logfile (str): The name of the log file to grab the modes from.
+
+    Returns:
+        modes (dict): freq (frequencies in cm^-1), ir (IR intensities in
+            km/mol), raman (Raman activities in A^4/amu, empty unless
+            freq=Raman) as np.arrays and n_imag, the number of imaginary modes
+
+    """
+    chunks = {"freq": [], "ir": [], "raman": []}
+    if os.path.getsize(logfile) > 0:
+        with open(logfile, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                matches = 0
+                for match in _VIB.finditer(mm):
+                    matches += 1
+                    kind = match.lastgroup
+                    if kind == "header":
+                        chunks = {"freq": [], "ir": [], "raman": []}
+                    else:
+                        chunks[kind].append(match.group(kind))
+                profiling.count(bytes=len(mm), matches=matches)
+    modes = dict((key, _to_array(value)) for key, value in chunks.items())
+    modes["n_imag"] = int(np.sum(modes["freq"] < 0))
+    return modes
+
+def harvest_vib_molecule(path):
+    """Collect the IR and Raman modes of one molecule directory
+
+    Args:
+        path (str): The molecule directory
+
+    Returns:
+        modes (dict): The grab_freq result of every log in VIB_LOGS, or None
+            for logs that do not exist
+
+    """
+    modes = {}
+    for step, log in VIB_LOGS.items():
+        logfile = os.path.join(path, log)
+        modes[step] = grab_freq(logfile) if os.path.isfile(logfile) else None
+    return modes
+
+def _pad(rows):
+    """Stack arrays of different length into a NaN padded 2D array"""
+    table = np.full((len(rows), max([len(row) for row in rows] + [0])), np.nan)
+    for i, row in enumerate(rows):
+        table[i,:len(row)] = row
+    return table
+
+def harvest_vib(root, grid, fwhm=10.0, shape="lorentzian", workers=None):
+    """Harvest and broaden the IR and Raman spectra of a whole campaign
+
+    Args:
+        root (str): The top directory of the campaign
+        grid (np.array): Wavenumber grid of the spectra in cm^-1
+        fwhm (float): Full width at half maximum in cm^-1 [default: 10]
+        shape (str): gaussian or lorentzian [default: lorentzian]
+        workers (int): Number of worker processes [default: os.cpu_count()]
+
+    Returns:
+        columns (dict): molecule, the NaN padded (nmol, nmodes) tables
+            ir_freq, ir_int, raman_freq and raman_act, the imaginary mode
+            counts ir_n_imag and raman_n_imag (-1 for missing logs) and the
+            broadened ir_spectra and raman_spectra on grid
+
+    """
+    molecules = harvest.find_molecules(root, logs=VIB_LOGS)
+    rows = []
+    if molecules:
+        nworkers = workers or os.cpu_count() or 1
+        with Pool(nworkers) as pool:
+            rows = pool.map(harvest_vib_molecule, molecules, chunksize=max(1, len(molecules)//(8*nworkers)))
+    empty = {"freq": np.array([]), "ir": np.array([]), "raman": np.array([]), "n_imag": -1}
+    ir = [row["infrared"] or empty for row in rows]
+    raman = [row["raman"] or empty for row in rows]
+    columns = {"molecule": np.array([os.path.relpath(path, root) for path in molecules], dtype=str),
+               "grid": np.asarray(grid, dtype=float),
+               "ir_freq": _pad([m["freq"] for m in ir]), "ir_int": _pad([m["ir"] for m in ir]),
+               "raman_freq": _pad([m["freq"] for m in raman]), "raman_act": _pad([m["raman"] for m in raman]),
+               "ir_n_imag": np.array([m["n_imag"] for m in ir], dtype=int),
+               "raman_n_imag": np.array([m["n_imag"] for m in raman], dtype=int)}
+    columns["ir_spectra"] = broaden.broaden(columns["ir_freq"], columns["ir_int"], grid, fwhm, shape=shape)
+    columns["raman_spectra"] = broaden.broaden(columns["raman_freq"], columns["raman_act"], grid, fwhm, shape=shape)
+    return columns
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Harvest and broaden the IR/Raman spectra of every molecule of a campaign')
+    parser.add_argument('-root', type=str, default=".", help='Top directory of the campaign [default: .]')
+    parser.add_argument('-out', type=str, default="vib.npz", help='Output file [default: vib.npz]')
+    parser.add_argument('-fwhm', type=float, default=10.0, help='Full width at half maximum in cm^-1 [default: 10]')
+    parser.add_argument('-shape', type=str, default="lorentzian", choices=["gaussian","lorentzian"], help='Line shape [default: lorentzian]')
+    parser.add_argument('-min', type=float, default=0.0, help='Lower end of the grid in cm^-1 [default: 0]')
+    parser.add_argument('-max', type=float, default=4000.0, help='Upper end of the grid in cm^-1 [default: 4000]')
+    parser.add_argument('-npts', type=int, default=4001, help='Number of grid points [default: 4001]')
+    parser.add_argument('-workers', type=int, default=None, help='Number of worker processes [default: all cores]')
+    args = parser.parse_args(argv)
+
+    columns = harvest_vib(args.root, np.linspace(args.min, args.max, args.npts), fwhm=args.fwhm, shape=args.shape, workers=args.workers)
+    np.savez_compressed(args.out, **columns)
+    print("Harvested %d molecules" % len(columns["molecule"]))
+
+if __name__ == "__main__":
+    main()
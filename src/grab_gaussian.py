@@ -1,8 +1,8 @@
 #!/usr/bin/env python
-import numpy as np
 import argparse
+import gauss_log
 
-def grab_excited(state):
+def grab_excited(state, logfile="vert_exc/vert_exc.log"):
     """This grabs the excited state energy from the vert_exc.log file
 
 
@@ -13,25 +13,45 @@ def grab_excited(state):
 
     Args:
         state (int): The excited state to grab the energy for
+        logfile (str): The log file to read [default: vert_exc/vert_exc.log]
 
     Returns:
         energy (float): The excited state energy in Hartrees
 
     """
-    with open("vert_exc/vert_exc.log",'r') as f:
-        lines = f.readlines()
-        for line in lines:
-            if "Excited State" in line:
-                vals=line.strip().split()
-                if state == int(vals[2][0]) or state == -1:
-                    print("Excited_State %s" % vals[2])
-                    print("%s"%vals[8])
-                    print("***")
-                    print("Absorption Wavelength %10.5f nm" % float(vals[6]))
-                    energy = float(vals[6])
-                    if state != -1:
-                        return energy
-def grab_exc_solv():
+    result = gauss_log.scan_log(logfile)
+    for exc in result["states"]:
+        if state == exc["state"] or state == -1:
+            print("Excited_State %d:" % exc["state"])
+            print("f=%.4f" % exc["f"])
+            print("***")
+            print("Absorption Wavelength %10.5f nm" % exc["nm"])
+            energy = exc["nm"]
+            if state != -1:
+                return energy
+
+def excited_table(logfile="vert_exc/vert_exc.log"):
+    """This grabs the table of excited states from the vert_exc.log file
+
+    Only the last block of excited states in the log is returned, so that
+    optimizations give the states of the final structure.
+
+    Args:
+        logfile (str): The log file to read [default: vert_exc/vert_exc.log]
+
+    Returns:
+        table (np.array): Structured array with fields state, ev (energy in
+            eV), nm (wavelength in nm) and f (oscillator strength)
+
+    """
+    import numpy as np
+    states = gauss_log.last_states(gauss_log.scan_log(logfile))
+    table = np.zeros(len(states), dtype=[("state", "i4"), ("ev", "f8"), ("nm", "f8"), ("f", "f8")])
+    for i, exc in enumerate(states):
+        table[i] = (exc["state"], exc["ev"], exc["nm"], exc["f"])
+    return table
+
+def grab_exc_solv(logfile="exc_solv/exc_solv.log"):
     """This grabs the excited state energy from the exc_solv.log file
     
     
@@ -40,21 +60,20 @@ def grab_exc_solv():
     the excited state geometry with the nonequilibrium solvation model. This is
     used to calculate the emission wavelength.
 
+    Args:
+        logfile (str): The log file to read [default: exc_solv/exc_solv.log]
+
     Returns:
         energy (float): The excited state energy in Hartrees
 
     """
-    energy = 0.0
-    with open("exc_solv/exc_solv.log",'r') as f:
-        lines = f.readlines()
-        for line in lines:
-            if "Total energy after correction" in line:
-                vals = line.strip().split()
-                energy = float(vals[5])
+    energy = gauss_log.scan_log(logfile)["corrected"]
+    if energy is None:
+        energy = 0.0
 
     return energy
 
-def grab_gs_sp():
+def grab_gs_sp(logfile="gs_sp/gs_sp.log"):
     """This grabs the ground state energy from the gs_sp.log file
 
     This function grabs the ground state energy from the gs_sp.log file, which
@@ -62,28 +81,35 @@ def grab_gs_sp():
     excited state geometry with the nonequilibrium solvation model. This is
     used to calculate the emission wavelength.
 
+    Args:
+        logfile (str): The log file to read [default: gs_sp/gs_sp.log]
+
     Returns:
         energy (float): The ground state energy in Hartrees
     
 
     """
     energy = 0.0
-    with open("gs_sp/gs_sp.log",'r') as f:
-        lines = f.readlines()
-        for line in lines:
-            if "SCF Done" in line:
-                vals = line.strip().split()
-                energy = float(vals[4])
+    scf = gauss_log.scan_log(logfile)["scf"]
+    if scf:
+        energy = scf[-1]
 
     return energy
 
 def conv_en(value):
     return 45.56337117/value
 
-if __name__ == "__main__":
-    grab_excited(1)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print the absorption and emission wavelengths of a molecule directory')
+    parser.add_argument('-state', type=int, default=1, help='Excited state to print, -1 for all [default: 1]')
+    args = parser.parse_args(argv)
+
+    grab_excited(args.state)
     en5 = grab_exc_solv()
     en6 = grab_gs_sp()
 
     em_en = en5-en6
-    print("Emission Wavelength: %10.5f nm" % conv_en(em_en))
\ No newline at end of file
+    print("Emission Wavelength: %10.5f nm" % conv_en(em_en))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+import argparse
+import csv
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+import gauss_log
+import log_cache
+from grab_gaussian import conv_en
+
+# Step logs of the absorption/emission workflow, relative to a molecule directory
+STEP_LOGS = {"vert_exc": "vert_exc/vert_exc.log",
+             "exc_solv": "exc_solv/exc_solv.log",
+             "gs_sp": "gs_sp/gs_sp.log"}
+
+def find_molecules(root, logs=STEP_LOGS):
+    """Find the molecule directories of a campaign
+
+    A molecule directory is any directory below root that holds at least one
+    of the workflow step directories. The walk does not descend into
+    molecule directories themselves.
+
+    Args:
+        root (str): The top directory of the campaign
+        logs (dict): Step logs relative to a molecule directory [default: STEP_LOGS]
+
+    Returns:
+        molecules (list): Sorted paths of the molecule directories
+
+    """
+    steps = set(os.path.dirname(log) for log in logs.values())
+    molecules = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        if steps.intersection(dirnames):
+            molecules.append(dirpath)
+            dirnames[:] = []
+        else:
+            dirnames.sort()
+    return sorted(molecules)
+
+def scan_step(path):
+    """Scan a step log, returning None if it does not exist"""
+    if not os.path.isfile(path):
+        return None
+    return gauss_log.scan_log(path)
+
+def harvest_molecule(path):
+    """Collect the absorption and emission results of one molecule directory
+
+    Args:
+        path (str): The molecule directory
+
+    Returns:
+        row (dict): See molecule_row
+
+    """
+    results = dict((step, scan_step(os.path.join(path, log))) for step, log in STEP_LOGS.items())
+    return molecule_row(path, results)
+
+def molecule_row(path, results):
+    """Build the harvest row of one molecule from its scanned step logs
+
+    Args:
+        path (str): The molecule directory
+        results (dict): scan_log result (or None) of every step in STEP_LOGS
+
+    Returns:
+        row (dict): molecule, the vert_exc excited states (ev, nm and f
+            lists), the emission wavelength in nm (NaN unless both exc_solv
+            and gs_sp have energies) and the status of every step log
+
+    """
+    row = {"molecule": path, "ev": [], "nm": [], "f": [], "emission_nm": np.nan}
+    if results["vert_exc"] is not None:
+        states = gauss_log.last_states(results["vert_exc"])
+        row["ev"] = [exc["ev"] for exc in states]
+        row["nm"] = [exc["nm"] for exc in states]
+        row["f"] = [exc["f"] for exc in states]
+    solv, sp = results["exc_solv"], results["gs_sp"]
+    if solv is not None and sp is not None and solv["corrected"] is not None and sp["scf"]:
+        row["emission_nm"] = conv_en(solv["corrected"] - sp["scf"][-1])
+    for step, result in results.items():
+        row["%s_status" % step] = gauss_log.status(result)
+    return row
+
+def harvest(root, workers=None, cachefile=None):
+    """Harvest every molecule directory of a campaign in a process pool
+
+    With a cache file, unchanged logs are served from the cache and logs
+    that have only grown are parsed from the last offset that was scanned;
+    only the remaining work is sent to the pool.
+
+    Args:
+        root (str): The top directory of the campaign
+        workers (int): Number of worker processes [default: os.cpu_count()]
+        cachefile (str): JSON parse cache to read and update [default: None]
+
+    Returns:
+        rows (list): One molecule_row per molecule, sorted by path
+
+    """
+    molecules = find_molecules(root)
+    if not molecules:
+        return []
+    cache = log_cache.load_cache(cachefile) if cachefile is not None else {}
+    results = {}
+    jobs = []
+    for path in molecules:
+        for log in STEP_LOGS.values():
+            logfile = os.path.abspath(os.path.join(path, log))
+            state, result = log_cache.lookup(cache, logfile)
+            if state == "missing":
+                results[logfile] = None
+            elif state == "hit":
+                results[logfile] = result
+            else:
+                jobs.append((logfile, result))
+    if jobs:
+        nworkers = workers or os.cpu_count() or 1
+        with Pool(nworkers) as pool:
+            for logfile, entry in pool.imap_unordered(log_cache.scan_entry, jobs, chunksize=max(1, len(jobs)//(8*nworkers))):
+                cache[logfile] = entry
+                results[logfile] = entry["result"]
+    if cachefile is not None:
+        log_cache.save_cache(cache, cachefile)
+    rows = []
+    for path in molecules:
+        steps = dict((step, results[os.path.abspath(os.path.join(path, log))]) for step, log in STEP_LOGS.items())
+        rows.append(molecule_row(path, steps))
+    return rows
+
+def rows_to_arrays(rows, root="."):
+    """Convert harvest rows to columnar arrays
+
+    Excited state columns are padded with NaN up to the largest number of
+    states found in any molecule.
+
+    Args:
+        rows (list): Rows as returned by harvest
+        root (str): Molecule paths are stored relative to this directory [default: .]
+
+    Returns:
+        columns (dict): molecule and status columns as string arrays, ev, nm
+            and f as (nmol, nstates) float arrays and emission_nm as a float
+            array
+
+    """
+    nstates = max([len(row["ev"]) for row in rows] + [0])
+    columns = {"molecule": np.array([os.path.relpath(row["molecule"], root) for row in rows], dtype=str)}
+    for key in ["ev", "nm", "f"]:
+        table = np.full((len(rows), nstates), np.nan)
+        for i, row in enumerate(rows):
+            table[i,:len(row[key])] = row[key]
+        columns[key] = table
+    columns["emission_nm"] = np.array([row["emission_nm"] for row in rows], dtype=float)
+    for step in STEP_LOGS:
+        columns["%s_status" % step] = np.array([row["%s_status" % step] for row in rows], dtype=str)
+    return columns
+
+def write_table(columns, prefix="harvest"):
+    """Write harvested columns to prefix.csv and prefix.npz
+
+    Args:
+        columns (dict): Columns as returned by rows_to_arrays
+        prefix (str): Output file name without extension [default: harvest]
+
+    """
+    np.savez(prefix + ".npz", **columns)
+    nstates = columns["ev"].shape[1]
+    status = ["%s_status" % step for step in STEP_LOGS]
+    header = ["molecule"]
+    for i in range(nstates):
+        header += ["ev_%d" % (i+1), "nm_%d" % (i+1), "f_%d" % (i+1)]
+    header += ["emission_nm"] + status
+    with open(prefix + ".csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for i in range(len(columns["molecule"])):
+            line = [columns["molecule"][i]]
+            for j in range(nstates):
+                line += ["%.4f" % columns["ev"][i,j], "%.2f" % columns["nm"][i,j], "%.4f" % columns["f"][i,j]]
+            line += ["%.5f" % columns["emission_nm"][i]] + [columns[key][i] for key in status]
+            writer.writerow(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Harvest absorption/emission results from every molecule directory of a campaign')
+    parser.add_argument('-root', type=str, default=".", help='Top directory of the campaign [default: .]')
+    parser.add_argument('-out', type=str, default="harvest", help='Output prefix for the .csv and .npz tables [default: harvest]')
+    parser.add_argument('-workers', type=int, default=None, help='Number of worker processes [default: all cores]')
+    parser.add_argument('-cache', type=str, default=None, help='Parse cache file to reuse results of unchanged logs [default: None]')
+    args = parser.parse_args(argv)
+
+    rows = harvest(args.root, workers=args.workers, cachefile=args.cache)
+    write_table(rows_to_arrays(rows, root=args.root), prefix=args.out)
+    print("Harvested %d molecules" % len(rows))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+import hashlib
+import json
+import os
+
+import gauss_log
+
+# Size of the slices of a log that make up its content fingerprint
+FINGERPRINT_BYTES = 65536
+
+def load_cache(cachefile):
+    """Load a parse cache, returning an empty one if the file does not exist
+
+    Args:
+        cachefile (str): The JSON cache file
+
+    Returns:
+        cache (dict): Cache entries keyed by absolute log path
+
+    """
+    if not os.path.isfile(cachefile):
+        return {}
+    with open(cachefile, "r") as f:
+        return json.load(f)
+
+def save_cache(cache, cachefile):
+    """Write a parse cache atomically, evicting entries of deleted logs first
+
+    Args:
+        cache (dict): Cache entries keyed by absolute log path
+        cachefile (str): The JSON cache file
+
+    """
+    prune(cache)
+    tmp = "%s.%d.tmp" % (cachefile, os.getpid())
+    with open(tmp, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp, cachefile)
+
+def prune(cache):
+    """Remove the entries of logs that no longer exist
+
+    Args:
+        cache (dict): Cache entries keyed by absolute log path
+
+    Returns:
+        removed (int): The number of evicted entries
+
+    """
+    stale = [path for path in cache if not os.path.isfile(path)]
+    for path in stale:
+        del cache[path]
+    return len(stale)
+
+def fingerprint(logfile, offset):
+    """Hash the content of a log up to offset
+
+    Only the first FINGERPRINT_BYTES and the FINGERPRINT_BYTES before offset
+    are hashed, which is enough to tell a log that has grown from one that
+    was rewritten without reading all of it.
+
+    Args:
+        logfile (str): The log file
+        offset (int): The byte offset the fingerprint covers
+
+    Returns:
+        digest (str): Hex digest of the sampled content
+
+    """
+    digest = hashlib.sha1()
+    with open(logfile, "rb") as f:
+        digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+        tail = max(FINGERPRINT_BYTES, offset - FINGERPRINT_BYTES)
+        if tail < offset:
+            f.seek(tail)
+            digest.update(f.read(offset - tail))
+    digest.update(str(offset).encode())
+    return digest.hexdigest()
+
+def lookup(cache, logfile):
+    """Look up a log in the cache
+
+    Args:
+        cache (dict): Cache entries keyed by absolute log path
+        logfile (str): The log file
+
+    Returns:
+        state (str): hit if the log is unchanged, grown if it has only been
+            appended to, miss if it must be parsed again and missing if it
+            does not exist
+        result (dict): The cached scan_log result for hit and grown, else None
+
+    """
+    path = os.path.abspath(logfile)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        cache.pop(path, None)
+        return "missing", None
+    entry = cache.get(path)
+    if entry is None or set(gauss_log.new_result()).difference(entry["result"]):
+        # Unknown log, or an entry written before scan_log gathered more quantities
+        return "miss", None
+    if entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns:
+        return "hit", entry["result"]
+    offset = entry["result"]["offset"]
+    if st.st_size > offset and fingerprint(path, offset) == entry["hash"]:
+        return "grown", entry["result"]
+    return "miss", None
+
+def scan_entry(job):
+    """Scan a log, continuing from a previous result, and build its cache entry
+
+    Args:
+        job (tuple): (logfile, result) where result is a previous scan_log
+            result to continue from, or None to parse from the start
+
+    Returns:
+        path (str): The absolute path of the log
+        entry (dict): size, mtime, hash and result of the scan
+
+    """
+    logfile, result = job
+    path = os.path.abspath(logfile)
+    st = os.stat(path)
+    result = gauss_log.scan_log(path, result)
+    entry = {"size": st.st_size, "mtime": st.st_mtime_ns,
+             "hash": fingerprint(path, result["offset"]), "result": result}
+    return path, entry
+
+def cached_scan(cache, logfile):
+    """Return the scan_log result of a log, parsing only what the cache lacks
+
+    Args:
+        cache (dict): Cache entries keyed by absolute log path, updated in place
+        logfile (str): The log file
+
+    Returns:
+        result (dict): The scan_log result, or None if the log does not exist
+
+    """
+    state, result = lookup(cache, logfile)
+    if state == "missing":
+        return None
+    if state == "hit":
+        return result
+    path, entry = scan_entry((logfile, result))
+    cache[path] = entry
+    return entry["result"]
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+import argparse
+import os
+import re
+import sys
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+import harvest
+import restart
+import workflow
+
+# Progress lines of a running gaussian job
+_PROGRESS = re.compile(rb"^(?:"
+                       rb" Cycle\s+(?P<cycle>\d+)\s+Pass"
+                       rb"| SCF Done:.*?after\s+(?P<scfdone>\d+)\s+cycles"
+                       rb"|(?P<notconv> >>>>>>>>>> Convergence criterion not met)"
+                       rb"| Step number\s+(?P<step>\d+)\s+out of a maximum of\s+(?P<maxstep>\d+)"
+                       rb"| Maximum Force\s+(?P<force>\S+)"
+                       rb"| Maximum Displacement\s+(?P<disp>\S+)"
+                       rb"|(?P<normal> Normal termination)"
+                       rb"|(?P<error> Error termination))", re.MULTILINE)
+
+def log_links(logfile):
+    """Return the number of Normal terminations a log ends with, from the input next to it"""
+    gjf = os.path.splitext(logfile)[0] + ".gjf"
+    if not os.path.isfile(gjf):
+        return 1
+    return restart.expected_links(gjf)
+
+def new_tracker(logfile):
+    """Return the progress tracker of a log that has not been read yet"""
+    now = time.time()
+    return {"log": logfile, "offset": 0, "partial": b"", "cycles": 0, "scf_converged": None,
+            "opt_step": 0, "max_steps": 0, "force": None, "disp": None, "status": "running",
+            "normal": 0, "links": log_links(logfile), "first_seen": now, "last_update": now, "step_times": []}
+
+def update(tracker):
+    """Read the bytes appended to a log since the last call and update its tracker
+
+    Args:
+        tracker (dict): The tracker of the log, updated in place
+
+    Returns:
+        changed (bool): True if new bytes were read
+
+    """
+    try:
+        size = os.path.getsize(tracker["log"])
+    except FileNotFoundError:
+        return False
+    if size < tracker["offset"]:
+        # The log was rewritten, e.g. by a resubmitted job
+        tracker.update(new_tracker(tracker["log"]))
+    if size == tracker["offset"]:
+        return False
+    with open(tracker["log"], "rb") as f:
+        f.seek(tracker["offset"])
+        data = tracker["partial"] + f.read(size - tracker["offset"])
+    tracker["offset"] = size
+    end = data.rfind(b"\n") + 1
+    tracker["partial"] = data[end:]
+    now = time.time()
+    for match in _PROGRESS.finditer(data, 0, end):
+        kind = match.lastgroup
+        if kind == "cycle":
+            tracker["cycles"] = int(match.group("cycle"))
+            if tracker["cycles"] == 1:
+                tracker["scf_converged"] = None
+        elif kind == "scfdone":
+            tracker["cycles"] = int(match.group("scfdone"))
+            tracker["scf_converged"] = True
+        elif kind == "notconv":
+            tracker["scf_converged"] = False
+        elif kind == "maxstep":
+            tracker["opt_step"] = int(match.group("step"))
+            tracker["max_steps"] = int(match.group("maxstep"))
+            tracker["step_times"].append(now)
+        elif kind == "force":
+            tracker["force"] = float(match.group("force"))
+        elif kind == "disp":
+            tracker["disp"] = float(match.group("disp"))
+        elif kind == "normal":
+            # An opt freq job or a multi-link input ends in several
+            tracker["normal"] += 1
+            if tracker["normal"] >= tracker["links"]:
+                tracker["status"] = "done"
+        elif kind == "error":
+            tracker["status"] = "failed"
+    tracker["last_update"] = now
+    return True
+
+def estimate(tracker):
+    """Estimate the elapsed and remaining wall time of a job in seconds
+
+    Elapsed time is measured from when the monitor first saw the log. The
+    remaining time of an optimization is extrapolated from the mean time per
+    optimization step observed so far and is None when it cannot be known.
+
+    Args:
+        tracker (dict): The tracker of the log
+
+    Returns:
+        elapsed (float): Seconds since the log was first seen
+        remaining (float): Estimated seconds left, or None
+
+    """
+    elapsed = tracker["last_update"] - tracker["first_seen"]
+    times = tracker["step_times"]
+    if tracker["status"] != "running" or len(times) < 2 or tracker["max_steps"] == 0:
+        return elapsed, None
+    per_step = (times[-1] - times[0]) / (len(times) - 1)
+    return elapsed, per_step * (tracker["max_steps"] - tracker["opt_step"])
+
+def find_logs(root):
+    """Find every gaussian log below root"""
+    logs = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        logs += [os.path.join(dirpath, name) for name in sorted(filenames) if name.endswith(".log")]
+    return logs
+
+def find_chains(root):
+    """Find the step logs of every molecule directory below root
+
+    Returns:
+        chains (dict): The logs of the workflow steps of each molecule
+            directory, in dependency order, whether they exist yet or not
+
+    """
+    inputs = dict((step["name"], os.path.join(step["dir"], step["input"])) for step in workflow.ABSORPTION + workflow.SPECTRA)
+    chains = {}
+    for path in harvest.find_molecules(root, logs=inputs):
+        chains[path] = [os.path.join(path, step["dir"], os.path.splitext(step["input"])[0] + ".log")
+                        for step in restart.molecule_steps(path)]
+    return chains
+
+def finished(trackers, chains):
+    """Tell whether there is nothing left to follow
+
+    A molecule has finished once none of its logs is running and either
+    every step log is done or some step failed, which stops the steps after
+    it. Logs outside molecule directories have finished when they are not
+    running.
+
+    Args:
+        trackers (dict): Trackers keyed by log path
+        chains (dict): Step logs per molecule directory, see find_chains
+
+    Returns:
+        finished (bool): True when no molecule has a step left to wait for
+
+    """
+    chained = set()
+    for logs in chains.values():
+        chained.update(logs)
+        states = [trackers[log]["status"] if log in trackers else "missing" for log in logs]
+        if "running" in states or ("failed" not in states and any(s != "done" for s in states)):
+            return False
+    return all(t["status"] != "running" for log, t in trackers.items() if log not in chained)
+
+def report(trackers, root=".", out=sys.stdout, show_done=False):
+    """Print one line of progress per log
+
+    Args:
+        trackers (dict): Trackers keyed by log path
+        root (str): Log paths are printed relative to this directory [default: .]
+        out (file): Where to print the report [default: sys.stdout]
+        show_done (bool): Include finished logs [default: False]
+
+    """
+    counts = {"running": 0, "done": 0, "failed": 0}
+    for log in sorted(trackers):
+        tracker = trackers[log]
+        counts[tracker["status"]] += 1
+        if tracker["status"] == "done" and not show_done:
+            continue
+        elapsed, remaining = estimate(tracker)
+        line = "%-50s %-8s scf %4d %-5s" % (os.path.relpath(log, root), tracker["status"], tracker["cycles"],
+                                            {True: "conv", False: "fail", None: "-"}[tracker["scf_converged"]])
+        if tracker["opt_step"] > 0:
+            line += " opt %3d/%-3d" % (tracker["opt_step"], tracker["max_steps"])
+            if tracker["force"] is not None and tracker["disp"] is not None:
+                line += " F %.6f D %.6f" % (tracker["force"], tracker["disp"])
+        line += " elapsed %7.0fs" % elapsed
+        if remaining is not None:
+            line += " left ~%7.0fs" % remaining
+        out.write(line + "\n")
+    out.write("running %d done %d failed %d\n" % (counts["running"], counts["done"], counts["failed"]))
+    out.flush()
+
+def monitor(root=".", interval=10.0, rescan=6, once=False, show_done=False):
+    """Follow every log below root until all of them have finished
+
+    The logs of a molecule are followed until its last step is done or one
+    of its steps failed, so the monitor keeps waiting between the steps of
+    a running workflow. Changed logs are detected with inotify when the inotify_simple module is
+    available and by comparing file sizes otherwise; in both cases only the
+    bytes appended since the last poll are read. At most one report is
+    written per interval, and the tree is searched for new logs every rescan
+    reports.
+
+    Args:
+        root (str): The top directory of the running jobs [default: .]
+        interval (float): Seconds between reports [default: 10]
+        rescan (int): Reports between searches for new logs [default: 6]
+        once (bool): Read every log once, report and return [default: False]
+        show_done (bool): Include finished logs in the report [default: False]
+
+    Returns:
+        trackers (dict): The trackers keyed by log path
+
+    """
+    trackers = {}
+    notify = None
+    watched = {}
+    chains = {}
+    polls = 0
+    if inotify_simple is not None and not once:
+        notify = inotify_simple.INotify()
+    while True:
+        if polls % rescan == 0:
+            chains = find_chains(root)
+            for log in find_logs(root):
+                if log not in trackers:
+                    trackers[log] = new_tracker(log)
+                directory = os.path.dirname(log)
+                if notify is not None and directory not in watched.values():
+                    flags = inotify_simple.flags.MODIFY | inotify_simple.flags.CREATE
+                    watched[notify.add_watch(directory, flags)] = directory
+        if notify is None or polls % rescan == 0:
+            for tracker in trackers.values():
+                if tracker["status"] == "running":
+                    update(tracker)
+        report(trackers, root=root, show_done=show_done)
+        polls += 1
+        if once or (trackers and finished(trackers, chains)):
+            return trackers
+        if notify is not None:
+            # read returns at every write to a log, so keep reading until the
+            # interval is over to report at most once per interval
+            deadline = time.monotonic() + interval
+            while time.monotonic() < deadline:
+                changed = set()
+                for event in notify.read(timeout=max(1, int(1000*(deadline - time.monotonic())))):
+                    changed.add(os.path.join(watched[event.wd], event.name))
+                for log in changed:
+                    if log in trackers:
+                        update(trackers[log])
+        else:
+            time.sleep(interval)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Follow the logs of running gaussian jobs')
+    parser.add_argument('-root', type=str, default=".", help='Top directory of the running jobs [default: .]')
+    parser.add_argument('-interval', type=float, default=10.0, help='Seconds between reports [default: 10]')
+    parser.add_argument('-once', type=int, default=0, help='Report once and exit? [0] No [1] Yes')
+    parser.add_argument('-all', type=int, default=0, help='Also show finished jobs? [0] No [1] Yes')
+    args = parser.parse_args(argv)
+
+    monitor(root=args.root, interval=args.interval, once=args.once == 1, show_done=args.all == 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+import argparse
+import functools
+import json
+import os
+import time
+
+# Profiling hooks for the parsers and generators. Nothing is recorded unless
+# profiling was switched on with enable() or by naming a trace file in the
+# GAUSS_PROFILE environment variable, so the hooks cost one check per call.
+# With GAUSS_PROFILE every profiled call appends one JSON line to the trace
+# file, which also collects the calls made in pool workers and job scripts.
+_STATE = {"enabled": False, "trace": os.environ.get("GAUSS_PROFILE") or None, "stack": [], "records": []}
+
+_COUNTERS = ("bytes", "matches", "files")
+
+def enable(trace=None):
+    """Start recording profiled calls
+
+    Args:
+        trace (str): Trace file every record is also appended to [default: None]
+
+    """
+    _STATE["enabled"] = True
+    if trace is not None:
+        _STATE["trace"] = trace
+
+def disable():
+    """Stop recording and return the records gathered in this process"""
+    _STATE["enabled"] = False
+    _STATE["trace"] = None
+    records, _STATE["records"] = _STATE["records"], []
+    return records
+
+def active():
+    return _STATE["enabled"] or _STATE["trace"] is not None
+
+def profiled(func):
+    """Record wall time and counters of every call of func while profiling is on
+
+    The bytes, matches and files counted by a call include those of the
+    profiled calls it makes.
+    """
+    name = "%s.%s" % (func.__module__, func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not active():
+            return func(*args, **kwargs)
+        frame = {"func": name, "arg": _describe(args, kwargs), "pid": os.getpid(),
+                 "bytes": 0, "matches": 0, "files": 0}
+        stack = _STATE["stack"]
+        stack.append(frame)
+        frame["start"] = time.time()
+        wall = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            frame["wall"] = time.perf_counter() - wall
+            stack.pop()
+            if stack:
+                for key in _COUNTERS:
+                    stack[-1][key] += frame[key]
+            _emit(frame)
+    return wrapper
+
+def count(bytes=0, matches=0, files=0):
+    """Add to the counters of the innermost profiled call, if any"""
+    stack = _STATE["stack"]
+    if stack:
+        frame = stack[-1]
+        frame["bytes"] += bytes
+        frame["matches"] += matches
+        frame["files"] += files
+
+def _describe(args, kwargs):
+    """Return the first file name like argument of a call, for the record"""
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, str):
+            return value
+    return None
+
+def _emit(frame):
+    if _STATE["enabled"]:
+        _STATE["records"].append(frame)
+    if _STATE["trace"] is not None:
+        # A single write of one line to a file opened for appending is not
+        # interleaved with the lines of other processes
+        fd = os.open(_STATE["trace"], os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(frame) + "\n").encode())
+        finally:
+            os.close(fd)
+
+def load_trace(trace):
+    """Read the records of a trace file
+
+    Args:
+        trace (str): A trace file written with GAUSS_PROFILE or enable(trace)
+
+    Returns:
+        records (list): One dict per profiled call with func, arg, pid,
+            start, wall, bytes, matches and files
+
+    """
+    records = []
+    with open(trace, "r") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+def summary(records):
+    """Total the records of every profiled function
+
+    Args:
+        records (list): Records as returned by disable or load_trace
+
+    Returns:
+        totals (dict): calls, wall (seconds), bytes, matches and files per function
+
+    """
+    totals = {}
+    for rec in records:
+        total = totals.setdefault(rec["func"], {"calls": 0, "wall": 0.0, "bytes": 0, "matches": 0, "files": 0})
+        total["calls"] += 1
+        total["wall"] += rec["wall"]
+        for key in _COUNTERS:
+            total[key] += rec[key]
+    return totals
+
+def write_json(records, filename):
+    """Write records and their summary to a JSON file"""
+    with open(filename, "w") as f:
+        json.dump({"summary": summary(records), "records": records}, f, indent=1)
+
+def print_summary(totals):
+    print("%-36s %8s %12s %14s %10s %7s" % ("function", "calls", "wall [s]", "bytes", "matches", "files"))
+    for name, total in sorted(totals.items(), key=lambda item: -item[1]["wall"]):
+        print("%-36s %8d %12.4f %14d %10d %7d" % (name, total["calls"], total["wall"], total["bytes"], total["matches"], total["files"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize a trace file written with GAUSS_PROFILE=<file>')
+    parser.add_argument('-trace', type=str, default="gauss_profile.jsonl", help='Trace file [default: gauss_profile.jsonl]')
+    parser.add_argument('-json', type=str, default=None, help='Also write the records and summary to this JSON file [default: None]')
+    args = parser.parse_args(argv)
+
+    records = load_trace(args.trace)
+    print_summary(summary(records))
+    if args.json is not None:
+        write_json(records, args.json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+import argparse
+import glob
+import os
+import re
+import time
+
+import gauss_log
+import harvest
+import workflow
+
+# opt, opt=CalcFC or opt=(CalcFC,MaxCycles=200) in a route
+_OPT = re.compile(r"(?<![\w=(,])opt(?:=\(([^)]*)\)|=([^\s()]+))?(?![\w])", re.IGNORECASE)
+_FREQ = re.compile(r"(?<![\w=(,])freq\b", re.IGNORECASE)
+_GEOM_GUESS = re.compile(r"(?<![\w=(,])(?:geom|guess)=(?:\([^)]*\)|\S+)", re.IGNORECASE)
+
+def molecule_steps(path):
+    """Return the workflow steps whose input exists in a molecule directory
+
+    NTO calculations read the vert_exc checkpoint, so they are given
+    vert_exc as parent here and are rerun whenever it is. A batched NTO job
+    (see gen_ntos.gen_batch_ntos) counts as one step.
+    """
+    steps = [step for step in workflow.ABSORPTION + workflow.SPECTRA if os.path.isfile(os.path.join(path, step["dir"], step["input"]))]
+    names = [step["name"] for step in steps]
+    for gjf in sorted(glob.glob(os.path.join(path, "ntos", "*", "state_*.gjf"))):
+        state = int(os.path.basename(os.path.dirname(gjf)))
+        step = dict(workflow.nto_step(state))
+        step["parents"] = ["vert_exc"] if "vert_exc" in names else []
+        steps.append(step)
+    if os.path.isfile(os.path.join(path, "ntos", "ntos.gjf")):
+        step = dict(workflow.nto_batch_step([1])[0], name="ntos")
+        step["parents"] = ["vert_exc"] if "vert_exc" in names else []
+        steps.append(step)
+    return workflow.topological(steps)
+
+def read_links(gjf):
+    """Return the Link 0 lines and the route of every link of an input file"""
+    with open(gjf, "r") as f:
+        text = f.read()
+    links = []
+    for chunk in re.split(r"^--Link1--[ \t]*$", text, flags=re.MULTILINE | re.IGNORECASE):
+        lines = [line.rstrip() for line in chunk.strip("\n").split("\n")]
+        i = 0
+        while i < len(lines) and lines[i].startswith("%"):
+            i += 1
+        route = []
+        while i + len(route) < len(lines) and lines[i + len(route)].strip():
+            route.append(lines[i + len(route)].strip())
+        links.append((lines[:i], " ".join(route)))
+    return links
+
+def read_route(gjf):
+    """Return the Link 0 lines and the route of the first link of an input file"""
+    return read_links(gjf)[0]
+
+def _parts(route):
+    """Return the jobs a route runs, each ending in its own Normal termination"""
+    opt, freq = _OPT.search(route) is not None, _FREQ.search(route) is not None
+    if opt and freq:
+        return ["opt", "freq"]
+    if opt:
+        return ["opt"]
+    if freq:
+        return ["freq"]
+    return ["other"]
+
+def expected_links(gjf):
+    """Return the number of Normal terminations the job of an input file prints
+
+    Every --Link1-- link prints one, and an opt freq route runs as two links.
+    """
+    return sum(len(_parts(route)) for link0, route in read_links(gjf))
+
+def check_step(path, step, min_age=1800):
+    """Classify one step of a molecule directory
+
+    Args:
+        path (str): The molecule directory
+        step (dict): The workflow step
+        min_age (float): Unfinished logs written to in the last min_age
+            seconds belong to a running job [default: 1800]
+
+    Returns:
+        status (str): done, failed, incomplete (truncated, e.g. by the
+            walltime), running or missing (never started)
+        result (dict): The scan_log result, or None for missing logs
+
+    """
+    gjf = os.path.join(path, step["dir"], step["input"])
+    log = os.path.splitext(gjf)[0] + ".log"
+    if not os.path.isfile(log):
+        return "missing", None
+    result = gauss_log.scan_log(log)
+    status = gauss_log.status(result, links=expected_links(gjf))
+    if status == "incomplete" and time.time() - os.path.getmtime(log) < min_age:
+        status = "running"
+    return status, result
+
+def check_molecule(path, min_age=1800):
+    """Classify every step of a molecule directory
+
+    Returns:
+        checks (list): (step, status, result) in dependency order
+
+    """
+    return [(step,) + check_step(path, step, min_age=min_age) for step in molecule_steps(path)]
+
+def plan(checks):
+    """Decide which steps of a molecule have to run again
+
+    A step is rerun when it failed, was cut off or never started, and so is
+    every step below it, since its checkpoint will change. Nothing is
+    planned for a molecule with a running step.
+
+    Args:
+        checks (list): (step, status, result) as returned by check_molecule
+
+    Returns:
+        rerun (list): The steps to run, in dependency order
+
+    """
+    if any(status == "running" for step, status, result in checks):
+        return []
+    rerun = []
+    for step, status, result in checks:
+        if status != "done" or any(p in [s["name"] for s in rerun] for p in step["parents"]):
+            rerun.append(step)
+    return rerun
+
+def restart_input(path, step, status, result):
+    """Return the text of the input that continues a step, or None to run the original
+
+    An optimization that got at least one SCF done restarts from its own
+    checkpoint with opt=Restart, followed by a --Link1-- frequency job if
+    the input asks for one. If only the frequency job is missing, just that
+    link is run on the optimized geometry in the checkpoint. Every link of
+    the input is read, so restart inputs can be restarted again. Every
+    other step is run again from its original input.
+    """
+    directory = os.path.join(path, step["dir"])
+    links = read_links(os.path.join(directory, step["input"]))
+    if status not in ("failed", "incomplete") or not os.path.isfile(os.path.join(directory, step["chk"])):
+        return None
+    parts = []
+    for link0, route in links:
+        parts += [(part, route) for part in _parts(route)]
+    # The jobs that ended in a Normal termination are done
+    remaining = parts[result["normal"]:]
+    if not remaining or any(part == "other" for part, route in remaining):
+        return None
+    if remaining[0][0] == "opt" and not result["scf"]:
+        return None
+    # Only the checkpoint is read from now on, not the %oldchk of the parent
+    link0 = [line for line in links[0][0] if not line.lower().startswith("%oldchk")]
+    routes = []
+    for part, route in remaining:
+        if part == "opt":
+            opt = _OPT.search(route)
+            options = [o for o in (opt.group(1) or opt.group(2) or "").split(",") if o and o.lower() != "restart"]
+            routes.append("#n opt=(%s)" % ",".join(options + ["Restart"]))
+        else:
+            freq = _GEOM_GUESS.sub("", _OPT.sub("", route))
+            routes.append(" ".join(freq.split() + ["Geom=AllCheck", "Guess=Read"]))
+    text = ""
+    for i, route in enumerate(routes):
+        if i > 0:
+            text += "--Link1--\n"
+        text += "\n".join(link0) + "\n" + route + "\n\n"
+    return text
+
+def backup(filename):
+    """Rename a file to the first free filename.N and return the new name"""
+    n = 1
+    while os.path.exists("%s.%d" % (filename, n)):
+        n += 1
+    os.rename(filename, "%s.%d" % (filename, n))
+    return "%s.%d" % (filename, n)
+
+def write_restart(path, checks, name="restart", nproc=28, h_rt="12:00:00", mem_per_core="4G"):
+    """Write the restart inputs and job script of one molecule directory
+
+    The logs of the steps that are rerun are kept as step.log.N, and inputs
+    that are replaced by restart inputs as step.gjf.N, so nothing of the
+    failed run is lost. restart.sh runs the planned steps in order and skips
+    the steps whose parents failed in the same job.
+
+    Args:
+        path (str): The molecule directory
+        checks (list): (step, status, result) as returned by check_molecule
+        name (str): The job name [default: restart]
+        nproc (int): Number of processors [default: 28]
+        h_rt (str): Walltime of the job [default: 12:00:00]
+        mem_per_core (str): Memory per core [default: 4G]
+
+    Returns:
+        rerun (list): The steps restart.sh runs, empty if there is nothing to do
+
+    """
+    rerun = plan(checks)
+    if not rerun:
+        return rerun
+    status = dict((step["name"], (s, result)) for step, s, result in checks)
+    for step in rerun:
+        gjf = os.path.join(path, step["dir"], step["input"])
+        log = os.path.splitext(gjf)[0] + ".log"
+        text = restart_input(path, step, *status[step["name"]])
+        if os.path.isfile(log):
+            backup(log)
+        if text is not None:
+            backup(gjf)
+            with open(gjf, "w") as f:
+                f.write(text)
+    dirs = dict((step["name"], step["dir"]) for step in rerun)
+    with open(os.path.join(path, "restart.sh"), "w") as f:
+        f.write("#!/bin/bash\n")
+        f.write("#\n")
+        f.write("#$ -N %s\n" % name)
+        f.write("#$ -j y\n")
+        f.write("#$ -l h_rt=%s\n" % h_rt)
+        f.write("#$ -pe mpi_28_tasks_per_node %d\n" % nproc)
+        f.write("#$ -l mem_per_core=%s\n" % mem_per_core)
+        f.write("#$ -V\n")
+
+        f.write("command -v module > /dev/null && module load gaussian/16.C.01\n")
+        f.write("failed=\"\"\n")
+        f.write("run_step() {\n")
+        f.write("    local dir=$1 input=$2\n")
+        f.write("    shift 2\n")
+        f.write("    for dep in \"$@\"; do\n")
+        f.write("        case \" $failed \" in *\" $dep \"*) failed=\"$failed $dir\"; return;; esac\n")
+        f.write("    done\n")
+        f.write("    (cd \"$dir\" && ${G16:-g16} \"$input\") || failed=\"$failed $dir\"\n")
+        f.write("}\n")
+        for step in rerun:
+            deps = [dirs[p] for p in step["parents"] if p in dirs]
+            f.write("run_step %s %s%s\n" % (step["dir"], step["input"], "".join(" " + d for d in deps)))
+        f.write("[ -z \"$failed\" ] || { echo \"Failed:$failed\"; exit 1; }\n")
+    return rerun
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find failed workflow steps and write restart jobs for them and the steps after them')
+    parser.add_argument('-root', type=str, default=".", help='Molecule directory or top directory of a campaign [default: .]')
+    parser.add_argument('-write', type=int, default=0, help='Write restart inputs, restart.sh and resubmit.sh? [0] No, only report [1] Yes')
+    parser.add_argument('-age', type=float, default=30, help='Minutes since the last write after which an unfinished log is not running anymore [default: 30]')
+    parser.add_argument('-nproc', type=int, default=28, help='Number of processors of the restart jobs [default: 28]')
+    parser.add_argument('-h_rt', type=str, default="12:00:00", help='Walltime of the restart jobs [default: 12:00:00]')
+    args = parser.parse_args(argv)
+
+    logs = dict((step["name"], os.path.join(step["dir"], step["input"])) for step in workflow.ABSORPTION + workflow.SPECTRA)
+    molecules = harvest.find_molecules(args.root, logs=logs)
+    resubmit = []
+    for path in molecules:
+        checks = check_molecule(path, min_age=60*args.age)
+        print("%-40s %s" % (os.path.relpath(path, args.root), " ".join("%s=%s" % (step["name"], status) for step, status, result in checks)))
+        if args.write == 1 and write_restart(path, checks, name="re-%s" % os.path.basename(os.path.abspath(path))[:12], nproc=args.nproc, h_rt=args.h_rt):
+            resubmit.append(path)
+    if args.write == 1:
+        with open(os.path.join(args.root, "resubmit.sh"), "w") as f:
+            for path in resubmit:
+                f.write("(cd %s && qsub restart.sh)\n" % os.path.relpath(path, args.root))
+        print("Wrote restart jobs for %d of %d molecules" % (len(resubmit), len(molecules)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+import argparse
+import json
+import math
+import os
+
+import gauss_log
+
+# Basis functions per atom for 6-31G(d,p) with cartesian d functions, by row
+# of the periodic table. Only used to size jobs whose molecule has no log yet.
+_ROW_NBASIS = {1: 5, 2: 15, 3: 19}
+_ROWS = {"H": 1, "He": 1, "Li": 2, "Be": 2, "B": 2, "C": 2, "N": 2, "O": 2, "F": 2, "Ne": 2,
+         "Na": 3, "Mg": 3, "Al": 3, "Si": 3, "P": 3, "S": 3, "Cl": 3, "Ar": 3}
+_ATOMIC_ROWS = {1: 1, 2: 1, 3: 2, 4: 2, 5: 2, 6: 2, 7: 2, 8: 2, 9: 2, 10: 2,
+                11: 3, 12: 3, 13: 3, 14: 3, 15: 3, 16: 3, 17: 3, 18: 3}
+
+# Cost exponent in NBasis used when a step has fewer than two distinct sizes in the history
+DEFAULT_EXPONENT = 3.0
+
+def step_name(logfile):
+    """Return the workflow step a log belongs to, e.g. vert_exc/vert_exc.log -> vert_exc"""
+    stem = os.path.splitext(os.path.basename(logfile))[0]
+    if stem.startswith("state_"):
+        return "nto"
+    return stem
+
+def estimate_nbasis(coords):
+    """Roughly estimate the number of basis functions of a molecule
+
+    Args:
+        coords (list): Coordinate lines "element x y z"; the element may be a
+            symbol or an atomic number
+
+    Returns:
+        nbasis (int): The estimated number of 6-31G(d,p) basis functions
+
+    """
+    nbasis = 0
+    for line in coords:
+        vals = line.split()
+        if len(vals) < 4:
+            continue
+        if vals[0].isdigit():
+            row = _ATOMIC_ROWS.get(int(vals[0]), 4)
+        else:
+            row = _ROWS.get(vals[0].capitalize(), 4)
+        nbasis += _ROW_NBASIS.get(row, 30)
+    return nbasis
+
+def load_history(historyfile):
+    """Load the run history, returning an empty one if the file does not exist
+
+    Returns:
+        history (dict): Records keyed by absolute log path
+
+    """
+    if not os.path.isfile(historyfile):
+        return {}
+    with open(historyfile, "r") as f:
+        return json.load(f)
+
+def save_history(history, historyfile):
+    tmp = "%s.%d.tmp" % (historyfile, os.getpid())
+    with open(tmp, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, historyfile)
+
+def record(history, root):
+    """Add every finished log below root to the run history
+
+    Args:
+        history (dict): Records keyed by absolute log path, updated in place
+        root (str): The directory to search for logs
+
+    Returns:
+        added (int): The number of new records
+
+    """
+    added = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            if not name.endswith(".log"):
+                continue
+            path = os.path.abspath(os.path.join(dirpath, name))
+            if path in history:
+                continue
+            result = gauss_log.scan_log(path)
+            if not gauss_log.terminated(result) or result["nbasis"] is None or result["cpu"] <= 0:
+                continue
+            history[path] = {"step": step_name(path), "nbasis": result["nbasis"], "nproc": result["nproc"] or 1,
+                             "cpu": result["cpu"], "elapsed": result["elapsed"]}
+            added += 1
+    return added
+
+def fit(history):
+    """Fit a per-step cost model to the run history
+
+    The cpu time of each step is modelled as cpu = exp(a) * NBasis**b by a
+    least squares fit in log-log space, and the parallel efficiency as the
+    mean of cpu / (elapsed * nproc).
+
+    Args:
+        history (dict): Records keyed by log path
+
+    Returns:
+        model (dict): a, b, eff and the number of records n, keyed by step
+
+    """
+    # NumPy is only needed for the fit, keep it out of the import of gen_gaussian
+    import numpy as np
+    steps = {}
+    for rec in history.values():
+        steps.setdefault(rec["step"], []).append(rec)
+    model = {}
+    for step, recs in steps.items():
+        nbasis = np.log([rec["nbasis"] for rec in recs])
+        cpu = np.log([rec["cpu"] for rec in recs])
+        if len(set(nbasis)) > 1:
+            b, a = np.polyfit(nbasis, cpu, 1)
+        else:
+            b = DEFAULT_EXPONENT
+            a = np.mean(cpu - b*nbasis)
+        eff = np.mean([min(1.0, rec["cpu"]/(rec["elapsed"]*rec["nproc"])) for rec in recs if rec["elapsed"] > 0] or [1.0])
+        model[step] = {"a": float(a), "b": float(b), "eff": float(eff), "n": len(recs)}
+    return model
+
+def suggest(model, steps, nbasis, max_nproc=28, mem_per_core=4, target_hours=4.0, safety=1.5):
+    """Suggest the resources of a job running one or more steps in a row
+
+    The job gets as many cores as it takes to finish the most expensive step
+    within target_hours, in multiples of 4 up to max_nproc, and a walltime of
+    safety times the predicted elapsed time of all steps. %mem is kept below
+    what the scheduler hands out for the cores. Steps that are not in the
+    model fall back to a full node for 12 hours.
+
+    Args:
+        model (dict): Cost model as returned by fit
+        steps (list): The names of the steps the job runs
+        nbasis (int): The number of basis functions of the molecule
+        max_nproc (int): The most cores a job may use [default: 28]
+        mem_per_core (int): Scheduler memory per core in GB [default: 4]
+        target_hours (float): Desired elapsed time of the longest step [default: 4]
+        safety (float): Walltime margin over the prediction [default: 1.5]
+
+    Returns:
+        resources (dict): nproc, mem (GB for %mem), h_rt and mem_per_core
+
+    """
+    if any(step not in model for step in steps):
+        nproc = max_nproc
+        hours = 12
+    else:
+        cpu = [math.exp(model[step]["a"]) * nbasis**model[step]["b"] / model[step]["eff"] for step in steps]
+        nproc = int(math.ceil(max(cpu) / (target_hours*3600) / 4.0)) * 4
+        nproc = max(1, min(max_nproc, nproc))
+        hours = max(1, int(math.ceil(safety * sum(cpu) / nproc / 3600)))
+    return {"nproc": nproc, "mem": max(1, int(nproc*mem_per_core*0.8)),
+            "h_rt": "%02d:00:00" % hours, "mem_per_core": "%dG" % mem_per_core}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record finished gaussian runs and fit a per-step cost model')
+    parser.add_argument('-history', type=str, default="sizing_history.json", help='Run history file [default: sizing_history.json]')
+    parser.add_argument('-record', type=str, default=None, help='Directory of finished runs to add to the history')
+    args = parser.parse_args(argv)
+
+    history = load_history(args.history)
+    if args.record is not None:
+        print("Recorded %d runs" % record(history, args.record))
+        save_history(history, args.history)
+    model = fit(history)
+    print("%-10s %6s %10s %8s %6s" % ("step", "runs", "exponent", "eff", "nb=500"))
+    for step in sorted(model):
+        m = model[step]
+        print("%-10s %6d %10.3f %8.3f %6s" % (step, m["n"], m["b"], m["eff"], suggest(model, [step], 500)["h_rt"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+import argparse
+import fcntl
+import json
+import os
+
+import numpy as np
+
+# Files of an archive directory
+DATA = "data.f8"
+INDEX = "index.jsonl"
+GRID = "grid.npy"
+LOCK = "lock"
+
+def create(path, grid=None):
+    """Create an empty spectral archive
+
+    An archive is a directory holding one append-only file of raw float64
+    values and an index with one JSON line per spectrum. With a shared grid
+    only the intensities of each spectrum are stored; without one every
+    spectrum is stored ragged, its frequencies followed by its intensities.
+
+    Args:
+        path (str): The archive directory
+        grid (np.array): Grid shared by every spectrum [default: None]
+
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, LOCK), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        _init(path, grid)
+        fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _init(path, grid=None):
+    """Create the files of an archive that do not exist yet, with its lock held"""
+    if grid is not None and not os.path.isfile(os.path.join(path, GRID)):
+        if os.path.isfile(os.path.join(path, DATA)) and os.path.getsize(os.path.join(path, DATA)) > 0:
+            raise ValueError("The archive %s already holds spectra without a shared grid" % path)
+        # Readers do not take the lock, so the grid appears whole or not at all
+        with open(os.path.join(path, GRID + ".tmp"), "wb") as f:
+            np.save(f, np.asarray(grid, dtype=float))
+        os.replace(os.path.join(path, GRID + ".tmp"), os.path.join(path, GRID))
+    for name in [DATA, INDEX]:
+        open(os.path.join(path, name), "a").close()
+
+def append(path, names, intensities, freqs=None, grid=None):
+    """Append spectra to an archive
+
+    The archive is locked while it is created if need be, checked and the
+    values and index lines are written, so several processes can append to
+    the same archive at the same time. Every spectrum is checked before
+    anything is written, and spectra computed on a grid are only appended to
+    an archive with the same grid.
+
+    Args:
+        path (str): The archive directory, created if it does not exist
+        names (list): The molecule name of every spectrum
+        intensities (list): The intensity array of every spectrum
+        freqs (list): The frequency array of every spectrum, for archives
+            without a shared grid [default: None]
+        grid (np.array): The grid of the spectra, shared by the archive,
+            which is created with it if it does not exist [default: None]
+
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, LOCK), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        _init(path, grid)
+        shared = os.path.isfile(os.path.join(path, GRID))
+        if shared == (freqs is not None):
+            raise ValueError("Pass freqs exactly when the archive %s has no shared grid" % path)
+        ngrid = len(np.load(os.path.join(path, GRID), mmap_mode="r")) if shared else None
+        if grid is not None:
+            stored = np.load(os.path.join(path, GRID))
+            if stored.shape != np.shape(grid) or not np.allclose(stored, grid):
+                raise ValueError("The spectra were computed on another grid than the archive %s" % path)
+        for i, name in enumerate(names):
+            length = ngrid if shared else len(freqs[i])
+            if len(intensities[i]) != length:
+                raise ValueError("Spectrum %s has %d intensities for %d frequencies" % (name, len(intensities[i]), length))
+        with open(os.path.join(path, DATA), "ab") as data, open(os.path.join(path, INDEX), "a") as index:
+            offset = data.seek(0, os.SEEK_END) // 8
+            for i, name in enumerate(names):
+                intensity = np.asarray(intensities[i], dtype="<f8")
+                if shared:
+                    block = intensity
+                else:
+                    block = np.concatenate([np.asarray(freqs[i], dtype="<f8"), intensity])
+                data.write(block.tobytes())
+                index.write(json.dumps({"name": name, "offset": offset, "length": len(intensity)}) + "\n")
+                offset += len(block)
+            data.flush()
+            index.flush()
+            os.fsync(data.fileno())
+            os.fsync(index.fileno())
+        fcntl.flock(lock, fcntl.LOCK_UN)
+
+def open_archive(path):
+    """Memory map an archive for reading
+
+    When a name was appended more than once the last spectrum wins. An
+    index line still being written by append is skipped.
+
+    Args:
+        path (str): The archive directory
+
+    Returns:
+        archive (dict): data (read-only np.memmap of every value), index
+            (entries keyed by name, in order of appearance) and grid (the
+            shared grid or None)
+
+    """
+    index = {}
+    with open(os.path.join(path, INDEX), "r") as f:
+        for line in f:
+            if line.strip() and line.endswith("\n"):
+                entry = json.loads(line)
+                index[entry["name"]] = entry
+    nvalues = os.path.getsize(os.path.join(path, DATA)) // 8
+    data = np.memmap(os.path.join(path, DATA), dtype="<f8", mode="r", shape=(nvalues,)) if nvalues else np.zeros(0)
+    grid = None
+    if os.path.isfile(os.path.join(path, GRID)):
+        grid = np.load(os.path.join(path, GRID), mmap_mode="r")
+    return {"data": data, "index": index, "grid": grid}
+
+def get(archive, name):
+    """Return one spectrum of an archive as views into the memory map
+
+    Args:
+        archive (dict): An archive from open_archive
+        name (str): The molecule name
+
+    Returns:
+        freq (np.array): The frequencies, or the shared grid
+        intensity (np.array): The intensities
+
+    """
+    entry = archive["index"][name]
+    start, length = entry["offset"], entry["length"]
+    if archive["grid"] is not None:
+        return archive["grid"], archive["data"][start:start+length]
+    return archive["data"][start:start+length], archive["data"][start+length:start+2*length]
+
+def stack(archive, names=None):
+    """Return the spectra of a shared-grid archive as one (nmol, ngrid) array
+
+    Args:
+        archive (dict): An archive from open_archive
+        names (list): The molecules to take [default: all, in index order]
+
+    Returns:
+        spectra (np.array): One row per molecule
+
+    """
+    if archive["grid"] is None:
+        raise ValueError("Only archives with a shared grid can be stacked")
+    names = list(archive["index"]) if names is None else names
+    return np.array([get(archive, name)[1] for name in names])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='List or export the spectra of a spectral archive')
+    parser.add_argument('archive', type=str, help='The archive directory')
+    parser.add_argument('-name', type=str, default=None, help='Export the spectrum of this molecule to spectra.dat')
+    args = parser.parse_args(argv)
+
+    archive = open_archive(args.archive)
+    if args.name is None:
+        for name, entry in archive["index"].items():
+            print("%-40s %10d %8d" % (name, entry["offset"], entry["length"]))
+    else:
+        freq, I = get(archive, args.name)
+        np.savetxt("spectra.dat",np.column_stack((freq,I)),fmt="%10.5f",header="Frequency (cm^-1) Intensity (a.u.)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+import argparse
+import json
+import os
+
+import profiling
+import workflow
+
+# Every step becomes one array job over all molecules of a batch and only
+# waits for its parents. IR and Raman are independent and run side by side.
+ABSORPTION_STEPS = workflow.ABSORPTION
+SPECTRA_STEPS = workflow.SPECTRA
+
+@profiling.profiled
+def write_array_script(filename, name, ntasks, commands, h_rt="12:00:00", nproc=28, mem_per_core="4G", hold=None):
+    """Write an SGE array job script
+
+    Args:
+        filename (str): The script to write
+        name (str): The job name
+        ntasks (int): The number of array tasks, submitted as -t 1-ntasks
+        commands (list): Shell lines run by every task; $SGE_TASK_ID selects the task
+        h_rt (str): Walltime of each task [default: 12:00:00]
+        nproc (int): Number of processors of each task [default: 28]
+        mem_per_core (str): Memory per core of each task [default: 4G]
+        hold (list): Names of array jobs whose matching tasks must finish
+            first, passed as -hold_jid_ad [default: None]
+
+    """
+    with open(filename,"w") as f:
+        f.write("#!/bin/bash\n")
+        f.write("#\n")
+        f.write("#$ -N %s\n" % name)
+        f.write("#$ -j y\n")
+        f.write("#$ -cwd\n")
+        f.write("#$ -t 1-%d\n" % ntasks)
+        f.write("#$ -l h_rt=%s\n" % h_rt)
+        f.write("#$ -pe mpi_28_tasks_per_node %d\n" % nproc)
+        f.write("#$ -l mem_per_core=%s\n" % mem_per_core)
+        if hold:
+            f.write("#$ -hold_jid_ad %s\n" % ",".join(hold))
+        f.write("#$ -V\n")
+
+        f.write("command -v module > /dev/null && module load gaussian/16.C.01\n")
+        for command in commands:
+            f.write(command + "\n")
+    profiling.count(files=1)
+
+def gen_array_jobs(molecules, steps, outdir=".", campaign="gauss", nproc=28, mem_per_core="4G", resources=None):
+    """Write one SGE array job per workflow step across a batch of molecules
+
+    Task i of every array works on line i of molecules.txt and skips steps
+    whose log already ends in Normal termination. Dependent steps
+    are held with -hold_jid_ad, so task i of a step starts as soon as task i
+    of its parent has finished, independent steps run side by side, and
+    every step requests its own walltime. A task whose g16 run fails or
+    leaves no checkpoint exits with status 100, which puts it in the error
+    state, so SGE keeps holding task i of every step after it. The arrays
+    are submitted in dependency order by submit_arrays.sh, and the workflow
+    is saved to arrays.json for run_local. Nothing is written for an empty
+    batch.
+
+    Args:
+        molecules (list): Molecule directories relative to outdir
+        steps (list): Step dicts with name, dir, input, h_rt and parents
+        outdir (str): Directory holding the molecule directories [default: .]
+        campaign (str): Prefix of the job names [default: gauss]
+        nproc (int): Number of processors per task [default: 28]
+        mem_per_core (str): Memory per core of each task [default: 4G]
+        resources (dict): nproc, h_rt and mem_per_core per step name, e.g.
+            sized from a cost model; these replace nproc, mem_per_core and
+            the h_rt of the step [default: None]
+
+    Returns:
+        scripts (list): The array job scripts in submission order
+
+    """
+    if not molecules:
+        return []
+    with open(os.path.join(outdir, "molecules.txt"),"w") as f:
+        for molecule in molecules:
+            f.write("%s\n" % molecule)
+    scripts = []
+    for step in workflow.topological(steps):
+        script = "array_%s.sh" % step["name"]
+        commands = ['MOL=$(sed -n "${SGE_TASK_ID}p" molecules.txt)',
+                    'cd "$MOL/%s" || exit 100' % step["dir"],
+                    'tail -n 1 %s.log 2> /dev/null | grep -q "Normal termination" || ${G16:-g16} %s || exit 100' % (os.path.splitext(step["input"])[0], step["input"]),
+                    '[ -e %s ] || exit 100' % step["chk"]]
+        sized = (resources or {}).get(step["name"], {})
+        write_array_script(os.path.join(outdir, script), "%s-%s" % (campaign, step["name"]), len(molecules), commands,
+                           h_rt=sized.get("h_rt", step["h_rt"]), nproc=sized.get("nproc", nproc),
+                           mem_per_core=sized.get("mem_per_core", mem_per_core),
+                           hold=["%s-%s" % (campaign, parent) for parent in step["parents"]])
+        scripts.append(script)
+    with open(os.path.join(outdir, "submit_arrays.sh"),"w") as f:
+        f.write("#!/bin/bash\n")
+        for script in scripts:
+            f.write("qsub %s\n" % script)
+    with open(os.path.join(outdir, "arrays.json"),"w") as f:
+        json.dump({"ntasks": len(molecules), "steps": workflow.topological(steps), "scripts": scripts}, f, indent=1)
+    return scripts
+
+def run_local(outdir=".", workers=1, env=None):
+    """Run the array jobs written by gen_array_jobs without a scheduler
+
+    This stands in for SGE when testing a workflow: the steps are run level
+    by level in dependency order, and all tasks of a level are run as bash
+    subprocesses with SGE_TASK_ID set, up to workers at a time. As with
+    -hold_jid_ad, task i of a step is not run when task i of one of its
+    parents failed. Set G16 in env to replace the g16 executable, e.g.
+    G16=true for a dry run.
+
+    Args:
+        outdir (str): Directory holding arrays.json [default: .]
+        workers (int): Number of tasks run at the same time [default: 1]
+        env (dict): Extra environment variables for the tasks [default: None]
+
+    Returns:
+        failed (list): (step, task) pairs that exited with a non-zero status
+            or were not run because a parent task failed
+
+    """
+    # Only needed here; importing them at the top slows down every gen_gaussian call
+    from concurrent.futures import ThreadPoolExecutor
+    with open(os.path.join(outdir, "arrays.json"),"r") as f:
+        dag = json.load(f)
+    scripts = dict(zip([step["name"] for step in dag["steps"]], dag["scripts"]))
+    finished = set()
+    failed = []
+    remaining = list(dag["steps"])
+    with ThreadPoolExecutor(workers) as pool:
+        while remaining:
+            level = [step for step in remaining if finished.issuperset(step["parents"])]
+            jobs = [(step["name"], task) for step in level for task in range(1, dag["ntasks"]+1)]
+            held = [(step["name"], task) for step in level for task in range(1, dag["ntasks"]+1)
+                    if any((parent, task) in failed for parent in step["parents"])]
+            jobs = [job for job in jobs if job not in held]
+            codes = pool.map(lambda job: _run_task(outdir, scripts[job[0]], job[1], env), jobs)
+            failed += held + [job for job, code in zip(jobs, codes) if code != 0]
+            finished.update(step["name"] for step in level)
+            remaining = [step for step in remaining if step not in level]
+    return failed
+
+def _run_task(outdir, script, task, env):
+    import subprocess
+    task_env = dict(os.environ)
+    task_env.update(env or {})
+    task_env["SGE_TASK_ID"] = str(task)
+    return subprocess.run(["bash", script], cwd=outdir, env=task_env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the SGE array jobs of a batch locally')
+    parser.add_argument('-dir', type=str, default=".", help='Directory holding arrays.json [default: .]')
+    parser.add_argument('-workers', type=int, default=1, help='Number of tasks to run at the same time [default: 1]')
+    parser.add_argument('-g16', type=str, default=None, help='Command to run instead of g16 [default: g16]')
+    args = parser.parse_args(argv)
+
+    failed = run_local(args.dir, workers=args.workers, env=None if args.g16 is None else {"G16": args.g16})
+    for step, task in failed:
+        print("Failed: %s task %d" % (step, task))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+import os
+
+import profiling
+
+# Declarative description of the gaussian workflows. Every step names its
+# directory, input file, checkpoint, the steps whose checkpoints it reads
+# (the first parent becomes its %oldchk), its route template, title, whether
+# the input carries the coordinates and the walltime of its own job. Route
+# templates are filled in with functional, basis, disp, nstates, solv_model,
+# solvent and, for NTO steps, state.
+ABSORPTION = [
+    {"name": "geom_opt", "dir": "ground_state_geom_opt", "input": "geom_opt.gjf", "chk": "ground_state_geom_opt.chk",
+     "parents": [], "coords": True, "h_rt": "12:00:00",
+     "route": "#n {functional}/{basis}{disp} opt freq SCRF=({solv_model},Solvent={solvent})",
+     "title": "Ground state geometry optimization"},
+    {"name": "vert_exc", "dir": "vert_exc", "input": "vert_exc.gjf", "chk": "vert_exc.chk",
+     "parents": ["geom_opt"], "coords": False, "h_rt": "04:00:00",
+     "route": "#n {functional}/{basis}{disp} TD=(Nstates={nstates},Root=1) Geom=Check Guess=Read SCRF=({solv_model},Solvent={solvent},CorrectedLR)",
+     "title": "Excited state corrected LR calculation"},
+    {"name": "exc_geom", "dir": "exc_geom", "input": "exc_geom.gjf", "chk": "exc_geom.chk",
+     "parents": ["vert_exc"], "coords": False, "h_rt": "12:00:00",
+     "route": "#n {functional}/{basis}{disp} TD=(Nstates={nstates},Root=1) Geom=Check Guess=Read SCRF=({solv_model},Solvent={solvent}) opt=CalcFC Freq NoSymm",
+     "title": "Excited state geometry optimization calculation"},
+    {"name": "exc_solv", "dir": "exc_solv", "input": "exc_solv.gjf", "chk": "exc_solv.chk",
+     "parents": ["exc_geom"], "coords": False, "h_rt": "04:00:00",
+     "route": "#n {functional}/{basis}{disp} TD=(Nstates={nstates},Root=1) Geom=Check Guess=Read SCRF=({solv_model},Solvent={solvent},CorrectedLR,NonEquilibrium=Save) NoSymm",
+     "title": "Excited state solvent field calculation"},
+    {"name": "gs_sp", "dir": "gs_sp", "input": "gs_sp.gjf", "chk": "gs_sp.chk",
+     "parents": ["exc_solv"], "coords": False, "h_rt": "02:00:00",
+     "route": "#n {functional}/{basis}{disp} Geom=Check Guess=Read SCRF=({solv_model},Solvent={solvent},NonEquilibrium=Read) NoSymm",
+     "title": "Ground state single point calculation"},
+]
+
+# IR and Raman are independent of each other
+SPECTRA = [
+    {"name": "infrared", "dir": "infrared", "input": "infrared.gjf", "chk": "infrared.chk",
+     "parents": [], "coords": True, "h_rt": "12:00:00",
+     "route": "#n {functional}/{basis}{disp} opt freq SCRF=({solv_model},Solvent={solvent})",
+     "title": "Ground state geometry optimization"},
+    {"name": "raman", "dir": "raman", "input": "raman.gjf", "chk": "raman.chk",
+     "parents": [], "coords": True, "h_rt": "12:00:00",
+     "route": "#n {functional}/{basis}{disp} opt freq=Raman SCRF=({solv_model},Solvent={solvent})",
+     "title": "Ground state geometry optimization"},
+]
+
+STEPS = dict((step["name"], step) for step in ABSORPTION + SPECTRA)
+
+NTO_ROUTE = "#n {functional}/{basis}{disp} Geom=AllCheck Guess=(Read,Only) Density=(Check,Transition={state}) Pop=(Minimal,NTO,SaveNTO) SCRF=(Solvent={solvent})"
+
+def nto_step(state, oldchk="../../vert_exc/vert_exc.chk"):
+    """Return the step computing the natural transition orbitals of one excited state"""
+    return {"name": "nto%d" % state, "dir": "ntos/%d" % state, "input": "state_%d.gjf" % state, "chk": "state_%d.chk" % state,
+            "parents": [], "oldchk": oldchk, "coords": False, "h_rt": "01:00:00", "state": state,
+            "route": NTO_ROUTE, "title": "Calculation of the Natural Transition Orbitals"}
+
+def nto_batch_step(states, oldchk="../vert_exc/vert_exc.chk"):
+    """Return the steps computing the NTOs of several states as the links of one job
+
+    Every link writes the NTOs of its state to its own checkpoint,
+    state_N.chk, in the ntos directory.
+    """
+    links = []
+    for state in states:
+        step = nto_step(state, oldchk=oldchk)
+        step.update({"dir": "ntos", "input": "ntos.gjf"})
+        links.append(step)
+    return links
+
+def gen_header(nproc, oldchk, chk, mem, cpu=None):
+    """Generate gaussian input file header
+
+    With cpu, e.g. "0-13", the job is pinned to those cores with %CPU
+    instead of asking for nproc cores with %NProcShared. Steps pinned to
+    part of an allocation run side by side, so mem, the memory of the whole
+    allocation, is then scaled to the share of the cores they get.
+    """
+    line1="%%NProcShared=%d" % nproc
+    if cpu is not None:
+        line1="%%CPU=%s" % cpu
+        first, last = [int(c) for c in cpu.split("-")]
+        mem = max(1, mem * (last - first + 1) // nproc)
+    if oldchk is not None:
+        line2="%%oldchk=%s" % oldchk
+    line3="%%chk=%s" % chk
+    line4="%%mem=%dGB" % mem
+    header = []
+    if oldchk is not None:
+        header = [line1, line2, line3, line4]
+    else:
+        header = [line1, line3, line4]
+
+    return header
+
+def oldchk(step, steps=STEPS):
+    """Return the %oldchk of a step, relative to its directory, or None"""
+    if "oldchk" in step:
+        return step["oldchk"]
+    if not step["parents"]:
+        return None
+    parent = steps[step["parents"][0]]
+    return "../%s/%s" % (parent["dir"], parent["chk"])
+
+def route(step, functional="B3LYP", basis="6-31(d,p)", dispersion=1, solv_model="PCM", solvent="Methanol", nstates=6):
+    """Fill in the route template of a step"""
+    disp = " empiricaldispersion=gd3" if dispersion == 1 else ""
+    return step["route"].format(functional=functional, basis=basis, disp=disp, nstates=nstates,
+                                solv_model=solv_model, solvent=solvent, state=step.get("state", 1))
+
+@profiling.profiled
+def gen_step(step, coords=None, path=".", nstates=6, functional="B3LYP", basis="6-31(d,p)", dispersion=1, solv_model="PCM",
+             solvent="Methanol", charge=0, multiplicity=1, nproc=28, mem=100, cpu=None, steps=STEPS):
+    """Generate the gaussian input file of a workflow step
+
+    Args:
+        step (dict): The step, e.g. STEPS["vert_exc"]
+        coords (list): Coordinate lines, written only for steps with coords set [default: None]
+        path (str): Directory the step directory is created in [default: .]
+        cpu (str): Cores to pin the job to, see gen_header [default: None]
+        steps (dict): The steps the parents of step are looked up in [default: STEPS]
+        The remaining arguments are as for the gen_* functions of gen_gaussian.py
+
+    Returns:
+        filename (str): The input file written
+
+    """
+    os.makedirs(os.path.join(path, step["dir"]),exist_ok=True)
+    filename = os.path.join(path, step["dir"], step["input"])
+    with open(filename,"w") as f:
+        write_link(f, step, coords=coords, nstates=nstates, functional=functional, basis=basis, dispersion=dispersion,
+                   solv_model=solv_model, solvent=solvent, charge=charge, multiplicity=multiplicity, nproc=nproc, mem=mem,
+                   cpu=cpu, steps=steps)
+    profiling.count(files=1)
+    return filename
+
+def write_link(f, step, coords=None, nstates=6, functional="B3LYP", basis="6-31(d,p)", dispersion=1, solv_model="PCM",
+               solvent="Methanol", charge=0, multiplicity=1, nproc=28, mem=100, cpu=None, steps=STEPS, sections=True):
+    """Write the input of one step to an open file, see gen_step
+
+    With sections=False the title and charge/multiplicity sections are left
+    out, as they must be for links that read them from the checkpoint with
+    Geom=AllCheck.
+    """
+    for line in gen_header(nproc, oldchk(step, steps), step["chk"], mem, cpu=cpu):
+        f.write(line+"\n")
+    f.write(route(step, functional=functional, basis=basis, dispersion=dispersion, solv_model=solv_model,
+                  solvent=solvent, nstates=nstates) + "\n")
+    f.write("\n")
+    if sections:
+        f.write("%s\n" % step["title"])
+        f.write("\n")
+        f.write("%d %d\n" % (charge, multiplicity))
+        if step["coords"]:
+            for coord in coords:
+                f.write("%s\n" % (coord))
+        f.write("\n")
+
+@profiling.profiled
+def gen_links(links, path=".", **kwargs):
+    """Generate one gaussian input file running several steps as --Link1-- links
+
+    All links must share the directory and input file of the first one.
+    Links whose route reads the geometry with Geom=AllCheck get no title
+    or charge/multiplicity sections.
+
+    Args:
+        links (list): The steps, in the order they run
+        path (str): Directory the step directory is created in [default: .]
+        kwargs: As for gen_step
+
+    Returns:
+        filename (str): The input file written
+
+    """
+    if not links:
+        raise ValueError("An input file needs at least one link")
+    os.makedirs(os.path.join(path, links[0]["dir"]),exist_ok=True)
+    filename = os.path.join(path, links[0]["dir"], links[0]["input"])
+    with open(filename,"w") as f:
+        for i, step in enumerate(links):
+            if i > 0:
+                f.write("--Link1--\n")
+            write_link(f, step, sections="geom=allcheck" not in step["route"].lower(), **kwargs)
+    profiling.count(files=1)
+    return filename
+
+def topological(steps):
+    """Order steps so that every step comes after its parents"""
+    done = []
+    remaining = list(steps)
+    while remaining:
+        ready = [step for step in remaining if all(p in [d["name"] for d in done] for p in step["parents"])]
+        if not ready:
+            raise ValueError("Workflow steps have a dependency cycle")
+        done += ready
+        remaining = [step for step in remaining if step not in ready]
+    return done
+
+def assign_cores(steps, nproc, min_cores=4):
+    """Split the cores of one allocation between the steps of a workflow
+
+    Steps are grouped by dependency depth. The steps of a group can run at
+    the same time, so the cores are split into as many disjoint slots as
+    there are steps in the group, but no slot gets fewer than min_cores.
+    When there are more steps than slots, a step waits for the previous step
+    of its slot.
+
+    Args:
+        steps (list): The workflow steps
+        nproc (int): The number of cores of the allocation
+        min_cores (int): The fewest cores a step may run on [default: 4]
+
+    Returns:
+        cores (dict): (cpu, after) per step name, where cpu is a core range
+            for %CPU and after lists extra steps to wait for
+
+    """
+    depth = {}
+    for step in topological(steps):
+        depth[step["name"]] = 1 + max([depth[p] for p in step["parents"]] + [-1])
+    cores = {}
+    for level in sorted(set(depth.values())):
+        group = [step for step in steps if depth[step["name"]] == level]
+        nslots = max(1, min(len(group), nproc // min_cores))
+        per = nproc // nslots
+        last = [None] * nslots
+        for i, step in enumerate(group):
+            slot = i % nslots
+            cpu = "%d-%d" % (slot*per, (slot+1)*per - 1)
+            cores[step["name"]] = (cpu, [] if last[slot] is None else [last[slot]])
+            last[slot] = step["name"]
+    return cores
+
+@profiling.profiled
+def gen_runner_script(steps, cores, filename, name="gauss", nproc=28, h_rt="12:00:00", mem_per_core="4G", skip=()):
+    """Write a job script that runs the steps of a workflow inside one allocation
+
+    Every step is started in the background as soon as the script starts and
+    waits until each step it depends on has left a .done marker next to its
+    input, which is only written once g16 finished and the checkpoint
+    exists. If a parent fails, its dependents give up instead of running on a
+    broken checkpoint. A step that only shares its cores with an earlier
+    step (see assign_cores) waits for it to finish either way, after the --
+    argument of run_step. Steps in skip are marked done without running.
+
+    Args:
+        steps (list): The workflow steps, with dir relative to the script
+        cores (dict): (cpu, after) per step name as returned by assign_cores
+        filename (str): The script to write
+        name (str): The job name [default: gauss]
+        nproc (int): Number of processors of the allocation [default: 28]
+        h_rt (str): Walltime of the allocation [default: 12:00:00]
+        mem_per_core (str): Memory per core [default: 4G]
+        skip (list): Directories of steps that are already done [default: ()]
+
+    """
+    byname = dict((step["name"], step) for step in steps)
+    marker = lambda step: "%s/%s" % (step["dir"], os.path.splitext(step["input"])[0])
+    with open(filename,"w") as f:
+        f.write("#!/bin/bash\n")
+        f.write("#\n")
+        f.write("#$ -N %s\n" % name)
+        f.write("#$ -j y\n")
+        f.write("#$ -l h_rt=%s\n" % h_rt)
+        f.write("#$ -pe mpi_28_tasks_per_node %d\n" % nproc)
+        f.write("#$ -l mem_per_core=%s\n" % mem_per_core)
+        f.write("#$ -V\n")
+
+        f.write("command -v module > /dev/null && module load gaussian/16.C.01\n")
+        f.write("run_step() {\n")
+        f.write("    local dir=$1 input=$2 chk=$3 dep slot=0\n")
+        f.write("    shift 3\n")
+        f.write("    for dep in \"$@\"; do\n")
+        f.write("        if [ \"$dep\" = \"--\" ]; then slot=1; continue; fi\n")
+        f.write("        until [ -e \"$dep.done\" ]; do\n")
+        f.write("            if [ -e \"$dep.failed\" ]; then\n")
+        f.write("                [ $slot = 1 ] && break\n")
+        f.write("                touch \"$dir/${input%.gjf}.failed\"; return 1\n")
+        f.write("            fi\n")
+        f.write("            sleep 10\n")
+        f.write("        done\n")
+        f.write("    done\n")
+        f.write("    if (cd \"$dir\" && ${G16:-g16} \"$input\") && [ -e \"$dir/$chk\" ]; then\n")
+        f.write("        touch \"$dir/${input%.gjf}.done\"\n")
+        f.write("    else\n")
+        f.write("        touch \"$dir/${input%.gjf}.failed\"\n")
+        f.write("    fi\n")
+        f.write("}\n")
+        for step in steps:
+            f.write("rm -f %s.done %s.failed\n" % (marker(step), marker(step)))
+        for step in steps:
+            if step["dir"] in skip:
+                f.write("touch %s.done\n" % marker(step))
+        for step in topological(steps):
+            if step["dir"] in skip:
+                continue
+            deps = [marker(byname[p]) for p in step["parents"] if p in byname]
+            after = [marker(byname[p]) for p in cores[step["name"]][1] if p in byname and p not in step["parents"]]
+            if after:
+                deps += ["--"] + after
+            f.write("run_step %s %s %s %s&\n" % (step["dir"], step["input"], step["chk"], "".join(d + " " for d in deps)))
+        f.write("wait\n")
+    profiling.count(files=1)